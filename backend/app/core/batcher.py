@@ -0,0 +1,68 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable
+
+import numpy as np
+from app.utils.metrics import Metrics
+
+
+class MicroBatcher():
+	'''Collects single rows that arrive close together and predicts them with one call.
+
+	Rows wait until the window has passed since the first of them, or until enough rows have arrived.
+	Each caller gets back the result of its own row. Only used from the event loop, so it needs no locks.
+	'''
+	def __init__(_self, _name: str, _predict: Callable[[np.ndarray], dict], _window: float, _rows: int, _executor: Executor | None = None):
+		'''Initial creation of the object.'''
+		_self.name = _name
+		# Predicts a batch of rows and returns a list per column, see ModelManager predict_batch
+		_self.predict_batch = _predict
+		_self.window = _window
+		_self.rows = _rows
+		_self.executor = _executor
+		_self.__pending: list[tuple[np.ndarray, asyncio.Future]] = []
+		_self.__timer: asyncio.TimerHandle | None = None
+		# Batches being predicted, kept so they are not garbage collected before they finish
+		_self.__running: set[asyncio.Task] = set()
+
+	async def predict(_self, _features: np.ndarray):
+		'''Predict one row of flattened days together with the other rows waiting at the same time.'''
+		loop = asyncio.get_running_loop()
+		future = loop.create_future()
+		_self.__pending.append((_features, future))
+		if len(_self.__pending) >= _self.rows:
+			_self.__flush()
+		elif _self.__timer is None:
+			_self.__timer = loop.call_later(_self.window, _self.__flush)
+		return await future
+
+	def __flush(_self):
+		'''Private method. Start predicting every waiting row.'''
+		if _self.__timer is not None:
+			_self.__timer.cancel()
+			_self.__timer = None
+		batch, _self.__pending = _self.__pending, []
+		if not batch:
+			return
+		task = asyncio.ensure_future(_self.__run(batch))
+		_self.__running.add(task)
+		task.add_done_callback(_self.__running.discard)
+
+	async def __run(_self, _batch: list[tuple[np.ndarray, asyncio.Future]]):
+		'''Private method. Predict a batch in the executor and give every caller its row.'''
+		Metrics.batch_sizes.observe(len(_batch), _self.name)
+		try:
+			columns = await asyncio.get_running_loop().run_in_executor(
+				_self.executor,
+				_self.predict_batch,
+				np.concatenate([features for features, _ in _batch])
+			)
+		except Exception as e:
+			for _, future in _batch:
+				if not future.done():
+					future.set_exception(e)
+			return
+		for index, (_, future) in enumerate(_batch):
+			# A caller that gave up no longer waits for its result
+			if not future.done():
+				future.set_result({name: values[index] for name, values in columns.items()})
@@ -0,0 +1,183 @@
+from datetime import date, timedelta
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from app.core.process_data import DataProcessor
+from app.utils.location import Location
+from app.utils.paths import Paths
+
+
+class DataIndex():
+	'''In-memory index over the processed dataset, keyed by LocationHash and then DayIndex.
+
+	Built once from the processed dataset so that a location and date range can be served without reading the file again.
+	Each location is kept separately, so appending days only touches the locations they belong to.
+	'''
+	def __init__(_self):
+		'''Initial creation of the object.'''
+		# Rows of each location indexed by DayIndex, None until the index is built
+		_self.frames: dict[int, pd.DataFrame] | None = None
+		# Flat copies of the frames for building model inputs without pandas overhead.
+		# Each location has one tuple of day indexes and features so an update swaps them at once.
+		_self.__arrays: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+		# DayIndex, Id and Block of the last row of every location, see DataProcessor.reconfigure
+		_self.__tails: dict[str, tuple[int, int, int]] = {}
+		# Identifies the processed dataset the index was built from, see DataProcessor.processed_signature
+		_self.signature: tuple | None = None
+		# Raw days of every location that are not processed yet, read on the first append, see DataProcessor.pending_days
+		_self.__pending: pd.DataFrame | None = None
+		# Stops two appends assigning the same blocks
+		_self.__lock = Lock()
+
+	def build(_self):
+		'''Load the processed dataset and index it by location and day.'''
+		if not Path(Paths.processed_dataset).is_file():
+			print('Processed dataset not found.')
+			DataProcessor.process_data()
+
+		print('Building data index.')
+		signature = DataProcessor.processed_signature()
+		imported_data = DataProcessor.load_processed()
+		imported_data.reset_index(inplace=True)
+		imported_data.sort_values(['LocationHash', 'DayIndex'], inplace=True, kind='stable')
+
+		last = imported_data.groupby('Location', sort=False)[['DayIndex', 'Id', 'Block']].last()
+		tails = { location: (int(row[0]), int(row[1]), int(row[2])) for location, row in zip(last.index, last.to_numpy()) }
+
+		imported_data.drop(columns=['Block', 'Id'], inplace=True)
+		frames = {}
+		arrays = {}
+		for key, rows in imported_data.groupby('LocationHash', sort=False):
+			rows = rows.set_index('DayIndex', drop=False)
+			frames[int(key)] = rows
+			arrays[int(key)] = DataIndex.__flatten(rows)
+		_self.__arrays = arrays
+		_self.__tails = tails
+		_self.__pending = None
+		_self.signature = signature
+		_self.frames = frames
+
+	@staticmethod
+	def __flatten(_rows: pd.DataFrame):
+		'''Private method. The day indexes and features of the rows of a location.'''
+		return _rows['DayIndex'].to_numpy(dtype=np.int64), _rows[DataProcessor.feature_columns].to_numpy(dtype=np.float64)
+
+	def clear(_self):
+		'''Drop the index, it will be rebuilt on the next query.'''
+		_self.frames = None
+		_self.__arrays = {}
+		_self.__tails = {}
+		_self.__pending = None
+		_self.signature = None
+
+	def query(_self, _location: Location, _from: date | None = None, _to: date | None = None):
+		'''Return the rows of a location between two dates (inclusive) as a list of records.'''
+		if _self.frames is None:
+			_self.build()
+
+		start = None if _from is None else DataProcessor.date_to_day_index(_from)
+		stop = None if _to is None else DataProcessor.date_to_day_index(_to)
+		# Pylance does not understand the index is always built at this point
+		frame = _self.frames.get(Location.name_to_id(_location)) # type: ignore
+		if frame is None:
+			return []
+		return frame.loc[start:stop].to_dict(orient='records')
+
+	def window(_self, _location: str, _date: date, _days: int = DataProcessor.block_size):
+		'''Return the model input for predicting a day, built from the days directly before it.
+
+		The result is a single row of the flattened days, or None if any of those days are missing.
+		'''
+		if _self.frames is None:
+			_self.build()
+
+		arrays = _self.__arrays.get(Location.name_to_id(_location))
+		if arrays is None:
+			return None
+		day_index, features = arrays
+
+		first = DataProcessor.date_to_day_index(_date) - _days
+		row = int(np.searchsorted(day_index, first))
+		# Days are unique and sorted, so the window is complete when both ends line up
+		if row + _days > len(day_index) or day_index[row] != first or day_index[row + _days - 1] != first + _days - 1:
+			return None
+		return features[row:row + _days].reshape(1, -1)
+
+	def all_windows(_self, _days: int = DataProcessor.block_size):
+		'''Yield every model input that window can build, one location at a time.
+
+		Each location gives its LocationHash, the DayIndex of the day each window predicts and the windows as rows of flattened days.
+		'''
+		if _self.frames is None:
+			_self.build()
+
+		for key, (day_index, features) in list(_self.__arrays.items()):
+			if len(day_index) < _days:
+				continue
+			# Days are unique and sorted, so a window is complete when its ends are the right distance apart
+			starts = np.flatnonzero(day_index[_days - 1:] - day_index[:len(day_index) - _days + 1] == _days - 1)
+			if len(starts) == 0:
+				continue
+			windows = sliding_window_view(features, (_days, features.shape[1]))[starts, 0]
+			yield key, day_index[starts] + _days, windows.reshape(len(starts), -1)
+
+	def append(_self, _observations: pd.DataFrame):
+		'''Add new days of raw data to the processed dataset and to the index.
+
+		Every day must be a known location and come after the last day stored for it,
+		also the days only in the raw dataset because their block is too short to process.
+		Returns the processed rows that were added, the days of blocks that are still too short are only in the raw dataset.
+		'''
+		if _self.frames is None:
+			_self.build()
+
+		with _self.__lock:
+			unknown = sorted({location for location in _observations['Location'] if Location.name_to_id(location) < 0})
+			if unknown:
+				raise ValueError('Unknown locations: ' + ', '.join(unknown))
+			days = (pd.to_datetime(_observations['Date'], format='%d-%m-%Y') - pd.Timestamp(DataProcessor.epoch)).dt.days
+			if pd.DataFrame({ 'Location': _observations['Location'], 'DayIndex': days }).duplicated().any():
+				raise ValueError('A day is given more than once')
+			if _self.__pending is None:
+				_self.__pending = DataProcessor.read_pending({ location: tail[0] for location, tail in _self.__tails.items() })
+			stored = { location: tail[0] for location, tail in _self.__tails.items() }
+			pending_days = (pd.to_datetime(_self.__pending['Date'], format='%d-%m-%Y') - pd.Timestamp(DataProcessor.epoch)).dt.days
+			for location, day in pending_days.groupby(_self.__pending['Location'], sort=False).max().items():
+				stored[location] = max(stored.get(location, day), int(day))
+			early = days <= _observations['Location'].map(stored)
+			if early.any():
+				raise ValueError('Days must come after the last stored day of their location: ' + ', '.join(sorted(set(_observations.loc[early, 'Location']))))
+
+			# Blocks are assigned on a copy so a failed append leaves the index as it was
+			tails = dict(_self.__tails)
+			rows, pending = DataProcessor.append_observations(_observations, tails, _self.__pending)
+
+			added = rows.reset_index().drop(columns=['Block', 'Id'])
+			for key, new_rows in added.groupby('LocationHash', sort=False):
+				new_rows = new_rows.set_index('DayIndex', drop=False)
+				frame = _self.frames.get(int(key)) # type: ignore
+				frame = new_rows if frame is None else pd.concat([frame, new_rows])
+				_self.frames[int(key)] = frame # type: ignore
+				_self.__arrays[int(key)] = DataIndex.__flatten(frame)
+			_self.__tails = tails
+			_self.__pending = pending
+			_self.signature = DataProcessor.processed_signature()
+			return rows
+
+	def completed_blocks(_self, _rows: pd.DataFrame):
+		'''Return the model inputs and targets of the blocks completed by the given processed rows.
+
+		Also returns the DayIndex of each target, which decides if it is used for training or testing.
+		'''
+		targets = _rows[_rows.index.get_level_values('Id') == DataProcessor.block_size]
+		width = DataProcessor.block_size * len(DataProcessor.feature_columns)
+		windows = [
+			_self.window(location, DataProcessor.epoch + timedelta(days=int(day) + 1), DataProcessor.block_size + 1)
+			for location, day in zip(targets.index.get_level_values('Location'), targets['DayIndex'])
+		]
+		# Blocks are runs of consecutive days, so every window is found
+		blocks = np.concatenate(windows) if windows else np.empty((0, width + len(DataProcessor.feature_columns)))
+		return blocks[:, :width], blocks[:, width:], targets['DayIndex'].to_numpy()
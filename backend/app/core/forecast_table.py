@@ -0,0 +1,138 @@
+import json
+import time
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.utils.paths import Paths
+
+
+class ForecastTable():
+	'''The predictions of one model for every window of the dataset, looked up by location and day.
+
+	A table belongs to the versions of the model and the dataset it was built from and is only used while those are loaded.
+	It is kept in memory and in a parquet file, so it survives restarts.
+	'''
+	# Columns of the file holding the LocationHash and DayIndex of each predicted day, apart from the predictions which have their own
+	key_columns = ['TargetLocation', 'TargetDay']
+
+	def __init__(_self, _path: str, _columns: list[str]):
+		'''Initial creation of the object.'''
+		_self.path = _path
+		_self.columns = _columns
+		# The model versions, the rows of each location by day, the predictions and when it was built, replaced at once
+		_self.__table: tuple[tuple, dict[int, tuple[int, np.ndarray]], np.ndarray, float] | None = None
+		# Counts the removals, a build started before one is thrown away
+		_self.__generation = 0
+		# Stops two builds writing the file at once, or a removal happening while one does
+		_self.__lock = Lock()
+
+	def build(_self, _versions: tuple, _windows, _predict):
+		'''Predict every window and store the results for the versions.
+
+		_windows gives the LocationHash, the DayIndex of the predicted days and the flattened windows of each location in turn.
+		_predict returns the unrounded predictions of many windows, they are copied so it may reuse its buffers.
+		Returns whether the table is kept, it is not if it was removed while building.
+		'''
+		generation = _self.__generation
+		locations, days, predictions = [], [], []
+		for location, target_days, features in _windows:
+			locations.append(np.full(len(target_days), location, dtype=np.int64))
+			days.append(target_days.astype(np.int64))
+			predictions.append(np.array(_predict(features), dtype=np.float64))
+		frame = pd.DataFrame(
+			np.concatenate(predictions) if predictions else np.empty((0, len(_self.columns))),
+			columns=_self.columns
+		)
+		frame.insert(0, ForecastTable.key_columns[0], np.concatenate(locations) if locations else np.empty(0, dtype=np.int64))
+		frame.insert(1, ForecastTable.key_columns[1], np.concatenate(days) if days else np.empty(0, dtype=np.int64))
+		built = time.time()
+		table = _self.__index(frame, _versions, built)
+		with _self.__lock:
+			if generation != _self.__generation:
+				return False
+			_self.__save(frame, _versions, built)
+			_self.__table = table
+		return True
+
+	def load(_self, _versions: tuple):
+		'''Read the table from its file if it was built for the versions, returns whether it was.'''
+		table = _self.__table
+		if table is not None and table[0] == _versions:
+			return True
+		try:
+			metadata = pq.read_schema(_self.path).metadata or {}
+		except (OSError, pa.ArrowInvalid):
+			return False
+		stored = json.loads(metadata.get(b'forecast', b'{}'))
+		# Compared as JSON, where the tuples in the versions become lists
+		if stored.get('Versions') != json.loads(json.dumps(list(_versions))):
+			return False
+		frame = pq.read_table(_self.path).to_pandas()
+		_self.__table = _self.__index(frame, _versions, stored['Built'])
+		return True
+
+	def get(_self, _versions: tuple, _location: int, _day: int):
+		'''The predictions of the window before a day, None if the table is for other versions or does not have it.'''
+		table = _self.__table
+		if table is None or table[0] != _versions:
+			return None
+		rows = table[1].get(_location)
+		if rows is None:
+			return None
+		first, offsets = rows
+		offset = _day - first
+		if offset < 0 or offset >= len(offsets) or offsets[offset] < 0:
+			return None
+		return table[2][offsets[offset]]
+
+	def unload(_self):
+		'''Forget the table in memory, the file is kept.'''
+		_self.__table = None
+
+	def remove(_self):
+		'''Forget the table and remove its file, a build running meanwhile is thrown away.
+
+		Only waits for a build that is writing the file, not for the predictions.
+		'''
+		with _self.__lock:
+			_self.__generation += 1
+			_self.__table = None
+			Path(_self.path).unlink(missing_ok=True)
+
+	def stats(_self, _versions: tuple):
+		'''Summary of the table for the API.'''
+		table = _self.__table
+		if table is None:
+			return { 'Rows': 0, 'Locations': 0, 'Built': None, 'Current': False }
+		return {
+			'Rows': len(table[2]),
+			'Locations': len(table[1]),
+			'Built': table[3],
+			'Current': table[0] == _versions
+		}
+
+	def __save(_self, _frame: pd.DataFrame, _versions: tuple, _built: float):
+		'''Private method. Write the table with the versions it belongs to in the file metadata.'''
+		table = pa.Table.from_pandas(_frame, preserve_index=False)
+		metadata = { **(table.schema.metadata or {}), b'forecast': json.dumps({ 'Versions': list(_versions), 'Built': _built }).encode() }
+		Path(_self.path).parent.mkdir(parents=True, exist_ok=True)
+		with Paths.replacing(_self.path) as temporary:
+			pq.write_table(table.replace_schema_metadata(metadata), temporary)
+
+	def __index(_self, _frame: pd.DataFrame, _versions: tuple, _built: float):
+		'''Private method. The row of every day of each location, so a lookup does not need to search.'''
+		locations = _frame[ForecastTable.key_columns[0]].to_numpy(dtype=np.int64)
+		days = _frame[ForecastTable.key_columns[1]].to_numpy(dtype=np.int64)
+		index = {}
+		for location in np.unique(locations):
+			rows = np.flatnonzero(locations == location)
+			first = int(days[rows].min())
+			# -1 marks days without a complete window before them
+			offsets = np.full(int(days[rows].max()) - first + 1, -1, dtype=np.int64)
+			offsets[days[rows] - first] = rows
+			index[int(location)] = (first, offsets)
+		return _versions, index, _frame[_self.columns].to_numpy(dtype=np.float64), _built
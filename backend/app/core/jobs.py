@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from threading import Lock
+from uuid import uuid4
+
+
+class Job():
+	'''A piece of background work and its outcome.'''
+	def __init__(_self, _name: str):
+		'''Initial creation of the object.'''
+		_self.id = uuid4().hex
+		_self.name = _name
+		_self.status = 'Queued'
+		_self.submitted = time.time()
+		_self.started: float | None = None
+		_self.finished: float | None = None
+		_self.result = None
+		_self.error: str | None = None
+		_self.future: Future | None = None
+
+	@property
+	def done(_self):
+		return _self.finished is not None
+
+	def describe(_self):
+		'''Summary of the job for the API.'''
+		end = _self.finished or time.time()
+		return {
+			'Id': _self.id,
+			'Name': _self.name,
+			'Status': _self.status,
+			'Elapsed': round(end - (_self.started or end), 3),
+			'Waited': round((_self.started or end) - _self.submitted, 3),
+			'Result': _self.result,
+			'Error': _self.error
+		}
+
+class JobManager():
+	'''Runs jobs on an executor and keeps track of them by id.
+
+	Submitting work under the name of a job that is still queued or running returns that job instead of starting another.
+	'''
+	def __init__(_self, _executor: Executor, _history: int = 100):
+		'''Initial creation of the object.'''
+		_self.executor = _executor
+		_self.history = _history
+		_self.__jobs: OrderedDict[str, Job] = OrderedDict()
+		_self.__active: dict[str, Job] = {}
+		_self.__lock = Lock()
+
+	def submit(_self, _name: str, _func, *_args):
+		'''Queue a call, or return the unfinished job already running under the same name.'''
+		with _self.__lock:
+			active = _self.__active.get(_name)
+			if active is not None:
+				return active
+
+			job = Job(_name)
+			_self.__jobs[job.id] = job
+			_self.__active[_name] = job
+			_self.__trim()
+			job.future = _self.executor.submit(_self.__run, job, _func, _args)
+		return job
+
+	def get(_self, _id: str):
+		'''Find a job by its id, None if it is unknown or too old.'''
+		return _self.__jobs.get(_id)
+
+	def __run(_self, _job: Job, _func, _args):
+		'''Private method. Run the job and record its outcome.'''
+		_job.status = 'Running'
+		_job.started = time.time()
+		try:
+			_job.result = _func(*_args)
+			_job.status = 'Finished'
+		except Exception as e:
+			_job.error = str(e)
+			_job.status = 'Failed'
+		finally:
+			_job.finished = time.time()
+			with _self.__lock:
+				if _self.__active.get(_job.name) is _job:
+					del _self.__active[_job.name]
+
+	def __trim(_self):
+		'''Private method. Forget the oldest finished jobs once there are more than the history allows.'''
+		finished = [id for id, job in _self.__jobs.items() if job.done]
+		for id in finished[:max(0, len(_self.__jobs) - _self.history)]:
+			del _self.__jobs[id]
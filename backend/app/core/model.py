@@ -1,14 +1,30 @@
-import warnings
+import hashlib
+import io
+import json
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import date
 from enum import Enum
+from multiprocessing import get_context
 from os import remove
 from pathlib import Path
+from shutil import rmtree
+from threading import Lock
+from typing import ClassVar
 
 import joblib
 import numpy as np
 import pandas as pd
+from app.core.batcher import MicroBatcher
+from app.core.data_index import DataIndex
+from app.core.forecast_table import ForecastTable
+from app.core.prediction_cache import PredictionCache
+from app.core.predictor import LinearPredictor
 from app.core.process_data import DataProcessor
 from app.utils.location import Location
+from app.utils.metrics import Metrics
 from app.utils.paths import Paths
+from app.utils.settings import Settings
 from pydantic import BaseModel, Field
 from sklearn.linear_model import Lasso, LinearRegression, Ridge
 from sklearn.metrics import mean_squared_error, r2_score
@@ -38,6 +54,35 @@ class DayData(BaseModel):
 	def tolist(_self):
 		return [_self.MinTemp, _self.MaxTemp, _self.Rainfall, _self.WindGustSpeed, _self.WindSpeed9am, _self.WindSpeed3pm, _self.Humidity9am, _self.Humidity3pm, _self.Pressure9am, _self.Pressure3pm, _self.Cloud9am, _self.Cloud3pm, _self.Temp9am, _self.Temp3pm, _self.DayIndex, _self.Year, _self.Month, Location.name_to_id(_self.Location)]
 
+	@staticmethod
+	def bounds():
+		'''The limits of every field as arrays, in the order of tolist.
+
+		Returns the lowest and highest values, whether those values are allowed themselves, and which fields are whole numbers.
+		The location is given by its id, so it must be one of the known ids.
+		'''
+		count = len(DayData.model_fields)
+		low = np.full(count, -np.inf)
+		high = np.full(count, np.inf)
+		low_inclusive = np.ones(count, dtype=bool)
+		high_inclusive = np.ones(count, dtype=bool)
+		whole = np.zeros(count, dtype=bool)
+		for index, (name, field) in enumerate(DayData.model_fields.items()):
+			if name == 'Location':
+				low[index], high[index], whole[index] = 0, len(Location) - 1, True
+				continue
+			whole[index] = field.annotation is int
+			for constraint in field.metadata:
+				if getattr(constraint, 'ge', None) is not None:
+					low[index] = constraint.ge
+				if getattr(constraint, 'gt', None) is not None:
+					low[index], low_inclusive[index] = constraint.gt, False
+				if getattr(constraint, 'le', None) is not None:
+					high[index] = constraint.le
+				if getattr(constraint, 'lt', None) is not None:
+					high[index], high_inclusive[index] = constraint.lt, False
+		return low, high, low_inclusive, high_inclusive, whole
+
 class PrerequisitData(BaseModel):
 	Day0: DayData = Field(..., description='A day of weather data.')
 	Day1: DayData = Field(..., description='A day of weather data.')
@@ -52,6 +97,8 @@ class PrerequisitData(BaseModel):
 	Day10: DayData = Field(..., description='A day of weather data.')
 	Day11: DayData = Field(..., description='A day of weather data.')
 	Day12: DayData = Field(..., description='A day of weather data.')
+	# Limits of the fields of a day, see DayData.bounds
+	day_bounds: ClassVar[tuple[np.ndarray, ...]] = DayData.bounds()
 
 	def tolist(_self):
 		return np.array([np.array([
@@ -70,6 +117,72 @@ class PrerequisitData(BaseModel):
 			_self.Day12.tolist()
 		]).flatten()])
 
+	@staticmethod
+	def decode(_body: bytes, _content_type: str):
+		'''Read windows sent as plain numbers instead of named fields, as one row of 13 flattened days per window.
+
+		A JSON body is a list of numbers, application/octet-stream is little-endian float64 values and application/x-npy a saved NumPy float64 array.
+		Each day holds the fields of DayData in order, with the location as its id. Binary bodies are read without copying.
+		Raises ValueError if the body can not be read or a value is out of range.
+		'''
+		media = _content_type.split(';')[0].strip().lower()
+		width = DataProcessor.block_size * len(DayData.model_fields)
+		if media == 'application/octet-stream':
+			if len(_body) % 8:
+				raise ValueError('The body is not a whole number of float64 values')
+			values = np.frombuffer(_body, dtype='<f8')
+		elif media == 'application/x-npy':
+			values = PrerequisitData.read_npy(_body)
+		else:
+			try:
+				values = np.asarray(json.loads(_body), dtype=np.float64)
+			except (TypeError, ValueError):
+				raise ValueError('The body is not an array of numbers')
+		if values.size == 0 or values.size % width:
+			raise ValueError(f'Every window needs {width} values, {DataProcessor.block_size} days of {len(DayData.model_fields)}')
+		features = values.reshape(-1, width)
+		PrerequisitData.check_array(features)
+		return features
+
+	@staticmethod
+	def read_npy(_body: bytes):
+		'''Read a saved NumPy array of float64 values without copying it.'''
+		stream = io.BytesIO(_body)
+		try:
+			version = np.lib.format.read_magic(stream)
+			if version == (1, 0):
+				shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+			else:
+				shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+		except ValueError:
+			raise ValueError('The body is not a NumPy array')
+		if dtype.kind != 'f' or dtype.itemsize != 8:
+			raise ValueError('The NumPy array must hold float64 values')
+		values = np.frombuffer(_body, dtype=dtype, offset=stream.tell())
+		if values.size != int(np.prod(shape)):
+			raise ValueError('The NumPy array is shorter than its header')
+		if fortran_order:
+			values = values.reshape(shape[::-1]).T
+		# Big endian values are the only ones copied
+		return values.astype(np.float64, copy=False)
+
+	@staticmethod
+	def check_array(_features: np.ndarray):
+		'''Check flattened windows against the limits of DayData, every value at once.
+
+		Raises ValueError naming the first value out of range.
+		'''
+		low, high, low_inclusive, high_inclusive, whole = PrerequisitData.day_bounds
+		days = _features.reshape(len(_features), DataProcessor.block_size, -1)
+		with np.errstate(invalid='ignore'):
+			valid = np.isfinite(days)
+			valid &= np.where(low_inclusive, days >= low, days > low)
+			valid &= np.where(high_inclusive, days <= high, days < high)
+			valid &= ~whole | (days == np.round(days))
+		if not valid.all():
+			window, day, field = np.argwhere(~valid)[0]
+			raise ValueError(f'Window {window} Day{day} {list(DayData.model_fields)[field]} is out of range: {days[window, day, field]}, {np.count_nonzero(~valid)} values in total')
+
 	@staticmethod
 	def test_data():
 		return PrerequisitData(
@@ -335,122 +448,578 @@ class PrerequisitData(BaseModel):
 			)
 		)
 
+class ReferenceData(BaseModel):
+	Location: str = Field('Penrith', description='The name of the location.')
+	Date: date = Field(..., description='The day to predict, the days before it are taken from the processed dataset.')
+
+class BatchData(BaseModel):
+	Windows: list[PrerequisitData] = Field([], description='Windows of days sent in full.')
+	References: list[ReferenceData] = Field([], description='Windows of days taken from the processed dataset.')
+
+class ObservationData(BaseModel):
+	Location: str = Field('Penrith', description='The name of the location.')
+	Date: date = Field(..., description='The day the readings were taken.')
+	MinTemp: float | None = Field(None, ge=-70, le=70, description='The minimum temperature for the day (C)')
+	MaxTemp: float | None = Field(None, ge=-70, le=70, description='The maximum temperature for the day (C).')
+	Rainfall: float | None = Field(None, ge=0, description='How much rain fell in the day (mm).')
+	WindGustSpeed: float | None = Field(None, ge=0, description='The maximum gust speed (km/h).')
+	WindSpeed9am: float | None = Field(None, ge=0, description='The rolling average wind speed at 9am (km/h).')
+	WindSpeed3pm: float | None = Field(None, ge=0, description='The rolling average wind speed at 3pm (km/h).')
+	Humidity9am: float | None = Field(None, ge=0, le=100, description='The air humidity at 9am (%).')
+	Humidity3pm: float | None = Field(None, ge=0, le=100, description='The air humidity at 3pm (%).')
+	Pressure9am: float | None = Field(None, gt=900, lt=1200, description='The air pressure at 9am (millibars).')
+	Pressure3pm: float | None = Field(None, gt=900, lt=1200, description='The air pressure at 3pm (millibars).')
+	Cloud9am: float | None = Field(None, ge=0, le=9, description='A rating of the amount of cloud cover at 9am (0-9).')
+	Cloud3pm: float | None = Field(None, ge=0, le=9, description='A rating of the amount of cloud cover at 3pm (0-9).')
+	Temp9am: float | None = Field(None, ge=-70, le=70, description='The temperature at 9am (C).')
+	Temp3pm: float | None = Field(None, ge=-70, le=70, description='The temperature at 3pm (C).')
+
+class ObservationBatch(BaseModel):
+	Observations: list[ObservationData] = Field(..., min_length=1, description='New days of readings, missing readings are filled in like the raw dataset.')
+
+	def toframe(_self):
+		'''The observations as rows of the raw dataset.'''
+		frame = pd.DataFrame([observation.model_dump() for observation in _self.Observations], dtype=object)
+		frame['Date'] = [observation.Date.strftime('%d-%m-%Y') for observation in _self.Observations]
+		measured = [column for column in frame.columns if column not in ('Location', 'Date')]
+		frame[measured] = frame[measured].astype('float64')
+		return frame
+
 class ModelType(str, Enum):
 	Linear = 'linear',
 	Ridge = 'ridge',
 	Lasso = 'lasso'
 
 class ModelManager():
+	# Decimal places each predicted column is rounded to, None rounds to a whole number
+	result_digits = {
+		'MinTemp': 2,
+		'MaxTemp': 2,
+		'Rainfall': 2,
+		'WindGustSpeed': None,
+		'WindSpeed9am': None,
+		'WindSpeed3pm': None,
+		'Humidity9am': None,
+		'Humidity3pm': None,
+		'Pressure9am': 4,
+		'Pressure3pm': 4,
+		'Cloud9am': None,
+		'Cloud3pm': None,
+		'Temp9am': 2,
+		'Temp3pm': 2,
+		'DayIndex': None,
+		'Year': None,
+		'Month': None,
+		'Location': None
+	}
+	# Train and test split of the processed dataset, and the file signature it was built from
+	__split_cache: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] | None = None
+	__split_signature: tuple | None = None
+	__split_lock = Lock()
+	# Model types that can be refitted from the sums kept with the model, without the full dataset
+	refittable = (ModelType.Linear, ModelType.Ridge)
+	# Windows completed by appended days are used for testing when their target day is a multiple of this
+	appended_test_interval = 5
+
 	class __Underlying():
-		def __init__(_self, _type: ModelType):
+		def __init__(_self, _type: ModelType, _executor: Executor | None = None):
 			'''Initial creation of the object.'''
-			_self.model: LinearRegression | Ridge | Lasso
+			_self.model: LinearRegression | Ridge | Lasso | None = None
+			# What predictions are made with, the model itself or its compiled coefficients, see ModelManager.compile
+			_self.predictor: LinearPredictor | LinearRegression | Ridge | Lasso | None = None
+			# Description of the loaded model, see ModelManager.save_model
+			_self.header: dict | None = None
+			# Modification time of the model file the loaded model came from
+			_self.version: int | None = None
+			# Sums of the training data the model was fitted on, see ModelManager.statistics
+			_self.statistics: dict | None = None
+			# Predictors per location hash when sharding is enabled, and the modification time of their folder
+			_self.shards: dict[int, LinearPredictor | LinearRegression | Ridge | Lasso] = {}
+			_self.shard_version: int | None = None
+			# Predicted rows keyed by the model versions and a hash of the features
+			_self.cache = PredictionCache(Settings.prediction_cache_size, Settings.prediction_cache_ttl)
+			# Collects single predictions into batches when micro-batching is enabled, the batches run on the executor
+			_self.batcher = MicroBatcher(
+				_type.value,
+				_self.predict_batch,
+				Settings.batch_window_ms / 1000,
+				Settings.batch_rows,
+				_executor
+			) if Settings.micro_batching else None
+			# Predictions of every window of the dataset, see build_forecasts
+			_self.forecasts = ForecastTable(ModelManager.select_forecast_path(_type), list(ModelManager.result_digits))
 			_self.type = _type
+			# Stops several threads loading or training the same missing model at once
+			_self.__lock = Lock()
 
 		def guarantee(_self):
-			'''Will either load a model from file or create and train a new one.'''
-			if not Path(ModelManager.select_model_path(_self.type)).is_file():
-				print(f'{_self.type} not found.')
-				_self.train()
-			else:
-				print(f'{_self.type} found.')
-				_self.model = joblib.load(
-					ModelManager.select_model_path(_self.type)
-				)
+			'''Will either load a model from file or create and train a new one.
+
+			A model already in memory is reused for as long as its file has not changed.
+			'''
+			with _self.__lock:
+				version = _self.__file_version()
+				if version is None:
+					print(f'{_self.type} not found.')
+					_self.train()
+				elif _self.model is None or version != _self.version:
+					print(f'{_self.type} found.')
+					_self.model, _self.header = ModelManager.load_model(_self.type)
+					_self.predictor = ModelManager.compile(_self.model)
+					_self.statistics = None
+					_self.version = version
+					_self.cache.clear()
+
+				if Settings.sharded_models:
+					_self.__guarantee_shards()
+
+		def __guarantee_shards(_self):
+			'''Private method. Will either load the location models from file or train new ones.'''
+			version = ModelManager.shard_version(_self.type)
+			if version is None:
+				print(f'{_self.type} location models not found.')
+				ModelManager.train_shards(_self.type)
+				version = ModelManager.shard_version(_self.type)
+			if version != _self.shard_version:
+				_self.__load_shards()
+				_self.shard_version = version
+				_self.cache.clear()
+
+		def __load_shards(_self):
+			'''Private method. Read the location models and compile them.'''
+			_self.shards = {
+				location: ModelManager.compile(model)
+				for location, model in ModelManager.load_shards(_self.type).items()
+			}
+
+		def ready(_self):
+			'''Whether a model is loaded and can predict straight away.'''
+			return _self.model is not None
+
+		def unload(_self):
+			'''Forget the model in memory, the next use will load or train it again.'''
+			_self.model = None
+			_self.predictor = None
+			_self.header = None
+			_self.statistics = None
+			_self.version = None
+			_self.shards = {}
+			_self.shard_version = None
+			_self.cache.clear()
+			_self.forecasts.unload()
+
+		def __file_version(_self):
+			'''Private method. The modification time of the model file, or None if it does not exist.'''
+			try:
+				return Path(ModelManager.select_model_path(_self.type)).stat().st_mtime_ns
+			except FileNotFoundError:
+				return None
 
 		def train(_self):
 			'''Import the dataset and train the model.
 
-			The model will be saved.
+			The model will be saved, and its evaluation is returned.
 			'''
-			_self.model = ModelManager.create_model(_self.type)
+			# Fit a new model on the side so predictions keep using the old one until it is ready
+			model = ModelManager.create_model(_self.type)
 			print(f'Training {_self.type} model.')
+			Metrics.model_requests.inc(1, _self.type.value, 'train')
 			X_train, X_test, Y_train, Y_test = ModelManager.import_and_split_data()
-			_self.model.fit(X_train, Y_train)
-			joblib.dump(
-				_self.model,
-				ModelManager.select_model_path(_self.type)
-			)
+			model.fit(X_train, Y_train)
+			header = {
+				'Type': _self.type.value,
+				'Features': DataProcessor.feature_columns,
+				'Days': DataProcessor.block_size,
+				'Data': hashlib.blake2b(np.ascontiguousarray(X_train).data, digest_size=16).hexdigest(),
+				'Metrics': ModelManager.metrics(Y_test, model.predict(X_test)),
+				'Trained': time.time()
+			}
+			statistics = ModelManager.statistics(X_train, Y_train) if _self.type in ModelManager.refittable else None
+			ModelManager.save_model(_self.type, model, header, _statistics=statistics)
+			_self.model, _self.header, _self.statistics = model, header, statistics
+			_self.predictor = ModelManager.compile(model)
+			_self.version = _self.__file_version()
+			_self.cache.clear()
+
+			if Settings.sharded_models:
+				ModelManager.train_shards(_self.type)
+				_self.__load_shards()
+				_self.shard_version = ModelManager.shard_version(_self.type)
+				_self.cache.clear()
+			return header['Metrics']
+
+		def refit(_self, _X: np.ndarray, _Y: np.ndarray):
+			'''Add new training rows to the model without fitting it on the whole dataset again.
+
+			The sums of the training data kept with the model are extended and the model is solved from them.
+			Only for the types in ModelManager.refittable, the others and models saved without sums are trained in full.
+			Location models are not refitted.
+			Returns the evaluation of the refitted model.
+			'''
+			if _self.__file_version() is None:
+				# A model trained now already includes the new rows
+				_self.guarantee()
+				return _self.header['Metrics'] # type: ignore
+			_self.guarantee()
+			with _self.__lock:
+				statistics = _self.statistics
+				if statistics is None and _self.type in ModelManager.refittable:
+					statistics = _self.statistics = ModelManager.load_statistics(_self.type)
+			if statistics is None:
+				return _self.train()
+
+			print(f'Refitting {_self.type} model.')
+			Metrics.model_requests.inc(1, _self.type.value, 'refit')
+			statistics = ModelManager.add_statistics(statistics, ModelManager.statistics(_X, _Y, statistics))
+			model = ModelManager.solve(_self.type, statistics)
+			X_train, X_test, Y_train, Y_test = ModelManager.import_and_split_data()
+			header = {
+				**(_self.header or {}),
+				# Chained from the data the model was fitted on before
+				'Data': hashlib.blake2b((_self.header or {}).get('Data', '').encode() + np.ascontiguousarray(_X).data, digest_size=16).hexdigest(),
+				'Metrics': ModelManager.metrics(Y_test, model.predict(X_test)),
+				'Trained': time.time()
+			}
+			with _self.__lock:
+				ModelManager.save_model(_self.type, model, header, _statistics=statistics)
+				_self.model, _self.header, _self.statistics = model, header, statistics
+				_self.predictor = ModelManager.compile(model)
+				_self.version = _self.__file_version()
+				_self.cache.clear()
+			return header['Metrics']
 
 		def evaluate(_self):
 			'''Evaluate the performance of the model.'''
 			print(f'Evaluating {_self.type} model.')
+			Metrics.model_requests.inc(1, _self.type.value, 'evaluate')
 			_self.guarantee()
 			X_train, X_test, Y_train, Y_test = ModelManager.import_and_split_data()
-			y_pred = _self.model.predict(X_test)
-			return {
-				'Mean Squared Error': f'{mean_squared_error(Y_test, y_pred):.2f}',
-				'R^2 Score': f'{r2_score(Y_test, y_pred):.2f}'
-			}
+			return ModelManager.metrics(Y_test, _self.__predict_rows(X_test))
 
 		def predict(_self, _pre: PrerequisitData):
-			print(f'Predicting with {_self.type} model.')
+			with Metrics.stage('feature_build', _self.type.value):
+				features = _pre.tolist()
+			return _self.predict_features(features)
+
+		def predict_features(_self, _features: np.ndarray):
+			'''Predict from an already flattened row of days.'''
+			columns = _self.predict_batch(_features)
+			return {name: values[0] for name, values in columns.items()}
+
+		async def predict_features_async(_self, _features: np.ndarray, _run):
+			'''Predict from an already flattened row of days without blocking the event loop.
+
+			The row joins a micro-batch when they are enabled, otherwise it is predicted on its own with _run, which runs blocking work.
+			'''
+			if _self.batcher is not None:
+				return await _self.batcher.predict(_features)
+			return await _run(_self.predict_features, _features)
+
+		def forecast(_self, _index: DataIndex, _location: str, _date: date):
+			'''Look up the prediction for a location and date in the forecast table, None if it is not there.
+
+			The table is only used while it belongs to the loaded model and the dataset of the index, and the model file has not changed since.
+			'''
+			row = None
+			if _self.model is not None and _self.__file_version() == _self.version:
+				row = _self.forecasts.get(_self.forecast_versions(_index), Location.name_to_id(_location), DataProcessor.date_to_day_index(_date))
+			Metrics.forecast_lookups.inc(1, _self.type.value, 'miss' if row is None else 'hit')
+			if row is None:
+				return None
+			return ModelManager.format_result(row)
+
+		def forecast_versions(_self, _index: DataIndex):
+			'''The versions of the model and of the dataset of the index that a forecast table belongs to.'''
+			return _self.version, _self.shard_version, _index.signature
+
+		def build_forecasts(_self, _index: DataIndex):
+			'''Predict every window of the index and store the results in the forecast table.
+
+			The table is built again if the model or the dataset changed meanwhile, so it always ends up matching both.
+			A table removed meanwhile, with its model, is not built again.
+			'''
+			while True:
+				_self.guarantee()
+				versions = _self.forecast_versions(_index)
+				print(f'Building {_self.type} forecast table.')
+				Metrics.model_requests.inc(1, _self.type.value, 'forecast')
+				kept = _self.forecasts.build(versions, _index.all_windows(), _self.__predict_rows)
+				if not kept or _self.forecast_versions(_index) == versions:
+					return _self.forecasts.stats(versions)
+
+		def guarantee_forecasts(_self, _index: DataIndex):
+			'''Will either load the forecast table of the model from file or build a new one.'''
 			_self.guarantee()
-			result = _self.model.predict(_pre.tolist()).tolist()[0]
-			return {
-				'MinTemp': result[0].__round__(2),
-				'MaxTemp': result[1].__round__(2),
-				'Rainfall': result[2].__round__(2),
-				'WindGustSpeed': result[3].__round__(),
-				'WindSpeed9am': result[4].__round__(),
-				'WindSpeed3pm': result[5].__round__(),
-				'Humidity9am': result[6].__round__(),
-				'Humidity3pm': result[7].__round__(),
-				'Pressure9am': result[8].__round__(4),
-				'Pressure3pm': result[9].__round__(4),
-				'Cloud9am': result[10].__round__(),
-				'Cloud3pm': result[11].__round__(),
-				'Temp9am': result[12].__round__(2),
-				'Temp3pm': result[13].__round__(2),
-				'DayIndex': result[14].__round__(),
-				'Year': result[15].__round__(),
-				'Month': result[16].__round__(),
-				'Location': Location.id_to_name(result[17].__round__())
-			}
+			versions = _self.forecast_versions(_index)
+			if _self.forecasts.load(versions):
+				return _self.forecasts.stats(versions)
+			return _self.build_forecasts(_index)
+
+		def predict_batch(_self, _features: np.ndarray):
+			'''Predict every row of flattened days with a single call to the model.
+
+			Rows predicted before by the same model are taken from the cache, only the others reach the model.
+			The results are returned as a list per column.
+			'''
+			model = _self.type.value
+			Metrics.model_requests.inc(1, model, 'predict')
+			Metrics.predictions.inc(len(_features), model)
+			with Metrics.stage('model_load', model):
+				_self.guarantee()
+			if not _self.cache.enabled:
+				with Metrics.stage('predict', model):
+					results = _self.__predict_rows(_features, True)
+				with Metrics.stage('serialization', model):
+					return ModelManager.format_results(results)
+
+			with Metrics.stage('cache', model):
+				features = np.ascontiguousarray(_features, dtype=np.float64)
+				# The same features give the same prediction for as long as the models do not change
+				versions = _self.version, _self.shard_version
+				keys = [(versions, hashlib.blake2b(row.data, digest_size=16).digest()) for row in features]
+				rows = [_self.cache.get(key) for key in keys]
+				missing = [index for index, row in enumerate(rows) if row is None]
+			Metrics.prediction_cache.inc(len(rows) - len(missing), model, 'hit')
+			Metrics.prediction_cache.inc(len(missing), model, 'miss')
+			if missing:
+				with Metrics.stage('predict', model):
+					predicted = _self.__predict_rows(features[missing], True)
+				for index, row in zip(missing, predicted):
+					rows[index] = row.copy()
+					_self.cache.put(keys[index], rows[index])
+			with Metrics.stage('serialization', model):
+				return ModelManager.format_results(np.stack(rows)) # type: ignore
+
+		def predict_rows(_self, _features: np.ndarray) -> np.ndarray:
+			'''Predict every row of flattened days into a new array, the results are not rounded.'''
+			_self.guarantee()
+			return _self.__predict_rows(_features)
+
+		def __predict_rows(_self, _features: np.ndarray, _buffered: bool = False) -> np.ndarray:
+			'''Private method. Predict with the location models where there is one, and the global model for the rest.
+
+			Buffered results may be overwritten by the next prediction on the thread, see LinearPredictor.predict_buffered.
+			'''
+			shards = _self.shards
+			if not shards:
+				return ModelManager.predict_with(_self.predictor, _features, _buffered)
+			# The last column holds the location of the last day, every day of a window is the same location
+			locations = _features[:, -1].astype(int)
+			results = np.empty((len(_features), len(ModelManager.result_digits)))
+			remaining = np.ones(len(_features), dtype=bool)
+			for location in np.unique(locations):
+				predictor = shards.get(int(location))
+				if predictor is None:
+					continue
+				rows = locations == location
+				# Copied into the results straight away, so buffers can be used
+				results[rows] = ModelManager.predict_with(predictor, _features[rows], True)
+				remaining &= ~rows
+			if remaining.any():
+				results[remaining] = ModelManager.predict_with(_self.predictor, _features[remaining], True)
+			return results
+
+
+	@staticmethod
+	def format_results(_results: np.ndarray):
+		'''Round the predictions and split them into columns.'''
+		columns = {
+			name: [value.__round__(digits) for value in values]
+			for (name, digits), values in zip(ModelManager.result_digits.items(), _results.T.tolist())
+		}
+		columns['Location'] = Location.ids_to_names(columns['Location']).tolist()
+		return columns
 
 	@staticmethod
-	def __divide_group(_group: pd.DataFrame):
-		'''Private method. Split up the group into features and a target.'''
-		features = _group.iloc[:-1]  # First rows as features
-		target = _group.iloc[-1:]     # Last row as the target
-		return features, target
+	def format_result(_result: np.ndarray):
+		'''Round the predictions of a single row, the same as format_results without the vectorized overhead.'''
+		row = {
+			name: value.__round__(digits)
+			for (name, digits), value in zip(ModelManager.result_digits.items(), _result.tolist())
+		}
+		row['Location'] = Location.id_to_name(row['Location'])
+		return row
 
 	@staticmethod
-	def __split_into_features_and_target(_df: pd.DataFrame):
-		'''Split a dataframe with groups into features and targets lists.'''
-		features_list = []
-		targets_list = []
-
-		for _, group in _df.groupby(['Location', 'Block'], sort=False):
-			features, target = ModelManager.__divide_group(group)
-			features_list.append(features.values.flatten())  # Flatten the features into one row
-			targets_list.append(target.values[0])  # Single target value
-
-		# Convert lists to arrays for scikit-learn
-		features = np.array(features_list)
-		targets = np.array(targets_list)
+	def split_into_features_and_target(_df: pd.DataFrame):
+		'''Split a dataframe with blocks into features and targets arrays.
+
+		Every complete block becomes one row, the first days flattened as the features and the last day as the target.
+		Blocks that are not complete are skipped.
+		'''
+		window = DataProcessor.block_size + 1
+		values = _df.to_numpy(dtype=np.float64)
+
+		complete = ModelManager.complete_blocks(_df)
+		if len(complete) * window != len(values):
+			values = values[(complete[:, None] + np.arange(window)).ravel()]
+
+		# Both results are views of the same array
+		blocks = values.reshape(len(complete), window, values.shape[1])
+		features = blocks[:, :-1].reshape(len(complete), -1)
+		targets = blocks[:, -1]
 		return features, targets
 
+	@staticmethod
+	def complete_blocks(_df: pd.DataFrame):
+		'''Positions of the first row of every complete block, the rows must be in DataProcessor.block_order.'''
+		location_codes = np.asarray(_df.index.codes[0]) # type: ignore
+		block_codes = np.asarray(_df.index.codes[1]) # type: ignore
+		starts = np.flatnonzero(np.r_[
+			True,
+			(location_codes[1:] != location_codes[:-1]) | (block_codes[1:] != block_codes[:-1])
+		])
+		sizes = np.diff(np.r_[starts, len(_df)])
+		return starts[sizes == DataProcessor.block_size + 1]
+
 	@staticmethod
 	def import_and_split_data():
+		'''Return the train and test split of the processed dataset.
+
+		The windows of the processed dataset file are split at random. Windows completed by appended days are split by their target day,
+		so adding them later with extend_split gives the same windows.
+		The split is cached for the whole process and only rebuilt when the processed dataset file changes.
+		The arrays are shared, so they must not be modified.
+		'''
 		# If the processed dataset doesn't exist, make it
 		if not Path(Paths.processed_dataset).is_file():
 			print('Processed dataset not found.')
 			DataProcessor.process_data()
 
-		# Pandas complains that I'm not using dtype parameter but doing so causes a stack overflow
-		with warnings.catch_warnings(action='ignore'):
-			imported_data = pd.read_csv(
-				Paths.processed_dataset,
-				index_col=[0, 1, 2],
-				memory_map=True
-			)
+		# Only one thread builds the split, the others wait and reuse it
+		with ModelManager.__split_lock:
+			signature = DataProcessor.processed_signature()
+			if ModelManager.__split_cache is not None and ModelManager.__split_signature == signature:
+				return ModelManager.__split_cache
 
-		imported_data.drop(columns=['Day'], inplace=True)
+			appended = DataProcessor.appended_files()
+			imported_data = DataProcessor.read_processed(Paths.processed_dataset)
+			imported_data.drop(columns=['Day'], inplace=True)
+			base_rows = len(imported_data)
+			if appended:
+				frames = [imported_data]
+				frames.extend(DataProcessor.read_processed(str(path)).drop(columns=['Day']) for path in appended)
+				imported_data = pd.concat(frames)
+			# Processing in chunks keeps days appended to the raw dataset after the other locations, so the blocks are always put together
+			order = DataProcessor.block_order(imported_data)
+			imported_data = imported_data.iloc[order]
+			X, Y = ModelManager.split_into_features_and_target(imported_data)
+
+			if not appended:
+				X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=42)
+			else:
+				# A window belongs to the appended days when its target does
+				targets = ModelManager.complete_blocks(imported_data) + DataProcessor.block_size
+				is_appended = order[targets] >= base_rows
+				X_train, X_test, Y_train, Y_test = train_test_split(X[~is_appended], Y[~is_appended], test_size=0.2, random_state=42)
+				X_train, X_test, Y_train, Y_test = ModelManager.add_to_split(
+					(X_train, X_test, Y_train, Y_test),
+					X[is_appended],
+					Y[is_appended],
+					imported_data['DayIndex'].to_numpy()[targets[is_appended]]
+				)
+			ModelManager.__split_cache = X_train, X_test, Y_train, Y_test
+			ModelManager.__split_signature = signature
+			return X_train, X_test, Y_train, Y_test
+
+	@staticmethod
+	def is_test_window(_target_days: np.ndarray):
+		'''Whether windows completed by appended days are used for testing, decided by their target day.'''
+		return _target_days % ModelManager.appended_test_interval == 0
+
+	@staticmethod
+	def add_to_split(_split: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray], _X: np.ndarray, _Y: np.ndarray, _target_days: np.ndarray):
+		'''Return a copy of a train and test split with windows added to it by their target day.'''
+		X_train, X_test, Y_train, Y_test = _split
+		test = ModelManager.is_test_window(_target_days)
+		return (
+			np.concatenate([X_train, _X[~test]]),
+			np.concatenate([X_test, _X[test]]),
+			np.concatenate([Y_train, _Y[~test]]),
+			np.concatenate([Y_test, _Y[test]])
+		)
+
+	@staticmethod
+	def extend_split(_X: np.ndarray, _Y: np.ndarray, _target_days: np.ndarray, _signature: tuple | None):
+		'''Add the windows completed by appended days to the cached split.
 
-		X, Y = ModelManager.__split_into_features_and_target(imported_data)
-		X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=42)
-		return X_train, X_test, Y_train, Y_test
+		_signature is the processed dataset signature from before the days were appended.
+		A cache built from anything else is left alone, it is rebuilt on its next use.
+		'''
+		with ModelManager.__split_lock:
+			if ModelManager.__split_cache is None or ModelManager.__split_signature != _signature:
+				return
+			ModelManager.__split_cache = ModelManager.add_to_split(ModelManager.__split_cache, _X, _Y, _target_days)
+			ModelManager.__split_signature = DataProcessor.processed_signature()
+
+	@staticmethod
+	def statistics(_X: np.ndarray, _Y: np.ndarray, _shift: dict | None = None):
+		'''Sums of training data that linear models can be solved from, and added to when more data arrives.
+
+		The data is shifted by the means of the first data, so the sums stay small enough to keep their precision.
+		Give the sums being added to as _shift, so both are shifted the same.
+		'''
+		shift_x = _X.mean(axis=0) if _shift is None else _shift['Shift X']
+		shift_y = _Y.mean(axis=0) if _shift is None else _shift['Shift Y']
+		X = _X - shift_x
+		Y = _Y - shift_y
+		return {
+			'Count': len(X),
+			'Shift X': shift_x,
+			'Shift Y': shift_y,
+			'Sum X': X.sum(axis=0),
+			'Sum Y': Y.sum(axis=0),
+			'XtX': X.T @ X,
+			'XtY': X.T @ Y
+		}
+
+	@staticmethod
+	def add_statistics(_first: dict, _second: dict):
+		'''Combine the sums of two sets of training data, shifted the same.'''
+		return {
+			**_first,
+			'Count': _first['Count'] + _second['Count'],
+			'Sum X': _first['Sum X'] + _second['Sum X'],
+			'Sum Y': _first['Sum Y'] + _second['Sum Y'],
+			'XtX': _first['XtX'] + _second['XtX'],
+			'XtY': _first['XtY'] + _second['XtY']
+		}
+
+	@staticmethod
+	def solve(_type: ModelType, _statistics: dict):
+		'''Create a model with the least squares fit of the sums, the same fit as training on the data they came from.'''
+		model = ModelManager.create_model(_type)
+		count = _statistics['Count']
+		mean_x = _statistics['Sum X'] / count
+		mean_y = _statistics['Sum Y'] / count
+		# Centering the sums is the same as fitting an intercept
+		gram = _statistics['XtX'] - count * np.outer(mean_x, mean_x)
+		cross = _statistics['XtY'] - count * np.outer(mean_x, mean_y)
+		if _type == ModelType.Ridge:
+			gram = gram + model.alpha * np.eye(len(gram)) # type: ignore
+		# Repeated columns make the sums singular, least squares picks the smallest coefficients like LinearRegression does
+		coef = np.linalg.lstsq(gram, cross, rcond=None)[0].T
+		model.coef_ = coef
+		model.intercept_ = (mean_y + _statistics['Shift Y']) - coef @ (mean_x + _statistics['Shift X'])
+		model.n_features_in_ = len(gram)
+		return model
+
+	@staticmethod
+	def compile(_model: LinearRegression | Ridge | Lasso):
+		'''The predictor used for a model, its coefficients as a LinearPredictor unless compiled predictors are turned off.
+
+		With float64 the predictor uses the memory mapped coefficients of the model, with float32 every worker has its own copy.
+		'''
+		if not Settings.compiled_predictor:
+			return _model
+		return LinearPredictor.from_model(_model, Settings.predictor_dtype)
+
+	@staticmethod
+	def predict_with(_predictor: LinearPredictor | LinearRegression | Ridge | Lasso, _features: np.ndarray, _buffered: bool = False):
+		'''Predict with a compiled predictor or a model, into a buffer of the predictor when allowed.'''
+		if _buffered and isinstance(_predictor, LinearPredictor):
+			return _predictor.predict_buffered(_features)
+		return _predictor.predict(_features)
 
 	@staticmethod
 	def create_model(_type: ModelType):
@@ -462,6 +1031,125 @@ class ModelManager():
 			case ModelType.Lasso:
 				return Lasso()
 
+	@staticmethod
+	def metrics(_expected: np.ndarray, _predicted: np.ndarray):
+		'''The evaluation reported for a set of predictions.'''
+		return {
+			'Mean Squared Error': f'{mean_squared_error(_expected, _predicted):.2f}',
+			'R^2 Score': f'{r2_score(_expected, _predicted):.2f}'
+		}
+
+	@staticmethod
+	def save_model(_type: ModelType, _model: LinearRegression | Ridge | Lasso, _header: dict, _path: str | None = None, _statistics: dict | None = None):
+		'''Write a model and its header to the model path, or the path given.
+
+		The sums of the training data are kept with the model when given, see ModelManager.statistics.
+		The file is not compressed, so the model arrays can be memory mapped when loaded.
+		'''
+		path = _path or ModelManager.select_model_path(_type)
+		with Paths.replacing(path) as temporary:
+			joblib.dump({ 'Header': _header, 'Model': _model, 'Statistics': _statistics }, temporary)
+
+	@staticmethod
+	def load_model(_type: ModelType, _path: str | None = None):
+		'''Read a model and its header from the model path, or the path given.
+
+		The model arrays are memory mapped read only, so every worker process shares one copy of them.
+		Files from before headers were added return None as the header.
+		'''
+		artifact = joblib.load(_path or ModelManager.select_model_path(_type), mmap_mode='r')
+		if isinstance(artifact, dict):
+			return artifact['Model'], artifact['Header']
+		return artifact, None
+
+	@staticmethod
+	def load_statistics(_type: ModelType):
+		'''Read the sums of the training data kept with a model, None if the file has none.'''
+		artifact = joblib.load(ModelManager.select_model_path(_type), mmap_mode='r')
+		if isinstance(artifact, dict):
+			return artifact.get('Statistics')
+		return None
+
+	@staticmethod
+	def select_shard_directory(_type: ModelType):
+		return f'{Paths.shard_directory}/{_type.value}'
+
+	@staticmethod
+	def shard_version(_type: ModelType):
+		'''The modification time of the location models folder, or None if there are no location models.
+
+		Saving or removing a location model changes it.
+		'''
+		directory = Path(ModelManager.select_shard_directory(_type))
+		if not any(directory.glob('*.pkl')):
+			return None
+		return directory.stat().st_mtime_ns
+
+	@staticmethod
+	def fit_shard(_type: ModelType, _X: np.ndarray, _Y: np.ndarray):
+		'''Create and fit a model on the rows of one location. Runs in a separate process.'''
+		model = ModelManager.create_model(_type)
+		model.fit(_X, _Y)
+		return model
+
+	@staticmethod
+	def train_shards(_type: ModelType, _locations: list[int] | None = None):
+		'''Train one model per location in parallel processes and save them to the location models folder.
+
+		Only the locations given are trained, or every location in the dataset if none are given.
+		Returns the evaluation of each trained location.
+		'''
+		X_train, X_test, Y_train, Y_test = ModelManager.import_and_split_data()
+		# The last column holds the location of the window
+		train_locations = X_train[:, -1].astype(int)
+		test_locations = X_test[:, -1].astype(int)
+		locations = np.unique(train_locations) if _locations is None else _locations
+
+		directory = Path(ModelManager.select_shard_directory(_type))
+		directory.mkdir(parents=True, exist_ok=True)
+		print(f'Training {_type} location models.')
+		results = {}
+		# Spawned processes do not inherit the locks held by the server threads
+		with ProcessPoolExecutor(max_workers=Settings.shard_processes, mp_context=get_context('spawn')) as pool:
+			futures = {
+				int(location): pool.submit(
+					ModelManager.fit_shard,
+					_type,
+					X_train[train_locations == location],
+					Y_train[train_locations == location]
+				)
+				for location in locations
+				if (train_locations == location).any()
+			}
+			for location, future in futures.items():
+				model = future.result()
+				name = Location.id_to_name(location)
+				test_rows = test_locations == location
+				header = {
+					'Type': _type.value,
+					'Location': name,
+					'Features': DataProcessor.feature_columns,
+					'Days': DataProcessor.block_size,
+					'Metrics': ModelManager.metrics(Y_test[test_rows], model.predict(X_test[test_rows])) if test_rows.sum() > 1 else None,
+					'Trained': time.time()
+				}
+				ModelManager.save_model(_type, model, header, f'{directory}/{name}.pkl')
+				results[name] = header['Metrics']
+		return results
+
+	@staticmethod
+	def load_shards(_type: ModelType):
+		'''Read every location model of a model type, keyed by location hash.'''
+		shards = {}
+		for path in Path(ModelManager.select_shard_directory(_type)).glob('*.pkl'):
+			model, header = ModelManager.load_model(_type, str(path))
+			shards[Location.name_to_id(path.stem)] = model
+		return shards
+
+	@staticmethod
+	def select_forecast_path(_type: ModelType):
+		return f'{Paths.forecast_directory}/{_type.value}.parquet'
+
 	@staticmethod
 	def select_model_path(_type: ModelType):
 		match _type:
@@ -472,25 +1160,81 @@ class ModelManager():
 			case ModelType.Lasso:
 				return Paths.lasso_model
 
-	@staticmethod
-	def delete(_type: ModelType):
+	def delete(_self, _type: ModelType):
 		print(f'Removing {_type} model.')
+		_self.oftype(_type).unload()
+		_self.oftype(_type).forecasts.remove()
+		rmtree(ModelManager.select_shard_directory(_type), ignore_errors=True)
 		try:
 			remove(ModelManager.select_model_path(_type))
 			return 'Model deleted'
 		except:
 			return 'No model found'
 
-	def __init__(_self):
-		_self.__linear = ModelManager.__Underlying(ModelType.Linear)
-		_self.__ridge = ModelManager.__Underlying(ModelType.Ridge)
-		_self.__lasso = ModelManager.__Underlying(ModelType.Lasso)
+	def __init__(_self, _executor: Executor | None = None):
+		'''Initial creation of the object.
+
+		Micro-batches are predicted on the executor, or the default executor of the event loop if none is given.
+		'''
+		# The predictors of every type and their stacked coefficients, see predict_all
+		_self.__ensemble: tuple[list, LinearPredictor] | None = None
+		_self.__linear = ModelManager.__Underlying(ModelType.Linear, _executor)
+		_self.__ridge = ModelManager.__Underlying(ModelType.Ridge, _executor)
+		_self.__lasso = ModelManager.__Underlying(ModelType.Lasso, _executor)
 
 	def guarantee(_self):
 		_self.__linear.guarantee()
 		_self.__ridge.guarantee()
 		_self.__lasso.guarantee()
 
+	def predict_all(_self, _pre: PrerequisitData, _mean: bool = False):
+		'''Predict a window with every model type, and optionally the mean of their predictions.
+
+		When every model is compiled and there are no location models, the coefficients are stacked so one multiplication gives every prediction.
+		'''
+		Metrics.model_requests.inc(1, 'all', 'predict')
+		Metrics.predictions.inc(1, 'all')
+		with Metrics.stage('feature_build', 'all'):
+			features = _pre.tolist()
+		underlyings = [_self.oftype(_type) for _type in ModelType]
+		with Metrics.stage('model_load', 'all'):
+			for underlying in underlyings:
+				underlying.guarantee()
+		with Metrics.stage('predict', 'all'):
+			predictors = [underlying.predictor for underlying in underlyings]
+			if all(isinstance(predictor, LinearPredictor) for predictor in predictors) and not any(underlying.shards for underlying in underlyings):
+				ensemble = _self.__ensemble
+				# Stacked again whenever any of the models changed
+				if ensemble is None or any(old is not new for old, new in zip(ensemble[0], predictors)):
+					ensemble = _self.__ensemble = predictors, LinearPredictor.stack(predictors) # type: ignore
+				stacked = ensemble[1].predict_buffered(features)
+				results = stacked.reshape(len(features), len(underlyings), -1).transpose(1, 0, 2)
+			else:
+				results = np.stack([underlying.predict_rows(features) for underlying in underlyings])
+		with Metrics.stage('serialization', 'all'):
+			output = {
+				_type.value: {name: values[0] for name, values in ModelManager.format_results(rows).items()}
+				for _type, rows in zip(ModelType, results)
+			}
+			if _mean:
+				output['mean'] = {name: values[0] for name, values in ModelManager.format_results(results.mean(axis=0)).items()}
+			return output
+
+	def cache_stats(_self):
+		'''Return the prediction cache summary of every model type.'''
+		return {_type.value: _self.oftype(_type).cache.stats() for _type in ModelType}
+
+	def forecast_stats(_self, _index: DataIndex):
+		'''Return the forecast table summary of every model type, current when it matches the model and the dataset of the index.'''
+		return {
+			_type.value: _self.oftype(_type).forecasts.stats(_self.oftype(_type).forecast_versions(_index))
+			for _type in ModelType
+		}
+
+	def ready(_self):
+		'''Return the model types that are loaded and can predict straight away.'''
+		return [_type for _type in ModelType if _self.oftype(_type).ready()]
+
 	def oftype(_self, _type: ModelType):
 		match _type:
 			case ModelType.Linear:
@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class PredictionCache():
+	'''Keeps the most recently used predictions, each for a limited time.
+
+	A capacity of 0 turns the cache off, and a time to live of 0 keeps entries until they are pushed out.
+	'''
+	def __init__(_self, _capacity: int, _ttl: float):
+		'''Initial creation of the object.'''
+		_self.capacity = _capacity
+		_self.ttl = _ttl
+		_self.hits = 0
+		_self.misses = 0
+		# Key to the time the entry was stored and its value, least recently used first
+		_self.__entries: OrderedDict = OrderedDict()
+		_self.__lock = Lock()
+
+	@property
+	def enabled(_self):
+		return _self.capacity > 0
+
+	def get(_self, _key):
+		'''Return the stored value, or None if it is missing or too old.'''
+		with _self.__lock:
+			entry = _self.__entries.get(_key)
+			if entry is not None and _self.ttl and time.monotonic() - entry[0] > _self.ttl:
+				del _self.__entries[_key]
+				entry = None
+			if entry is None:
+				_self.misses += 1
+				return None
+			_self.__entries.move_to_end(_key)
+			_self.hits += 1
+			return entry[1]
+
+	def put(_self, _key, _value):
+		'''Store a value, pushing out the least recently used ones once over capacity.'''
+		if not _self.enabled:
+			return
+		with _self.__lock:
+			_self.__entries[_key] = (time.monotonic(), _value)
+			_self.__entries.move_to_end(_key)
+			while len(_self.__entries) > _self.capacity:
+				_self.__entries.popitem(last=False)
+
+	def clear(_self):
+		with _self.__lock:
+			_self.__entries.clear()
+
+	def stats(_self):
+		'''Summary of the cache for the API.'''
+		with _self.__lock:
+			size = len(_self.__entries)
+		requests = _self.hits + _self.misses
+		return {
+			'Size': size,
+			'Capacity': _self.capacity,
+			'Hits': _self.hits,
+			'Misses': _self.misses,
+			'Hit Ratio': round(_self.hits / requests, 4) if requests else None
+		}
@@ -0,0 +1,68 @@
+from threading import local
+
+import numpy as np
+from sklearn.linear_model import Lasso, LinearRegression, Ridge
+
+
+class LinearPredictor():
+	'''Predicts with the coefficients of a fitted linear model directly, skipping the input checks of scikit-learn.
+
+	Linear, Ridge and Lasso models all predict X @ coef_.T + intercept_, so every prediction is a single matrix multiplication.
+	'''
+	# Batches up to this many rows are written into a buffer kept per thread instead of a new array
+	buffer_rows = 64
+
+	def __init__(_self, _coef: np.ndarray, _intercept: np.ndarray, _dtype: str = 'float64'):
+		'''Initial creation of the object.
+
+		_coef has a row per feature and a column per predicted value, the transpose of coef_ in scikit-learn.
+		'''
+		_self.dtype = np.dtype(_dtype)
+		# Stored transposed, so the rows of a batch are multiplied straight into the result.
+		# Not copied when the type matches, so coefficients memory mapped from the model file stay shared between workers.
+		_self.coef = np.asarray(_coef, dtype=_self.dtype)
+		_self.intercept = np.asarray(_intercept, dtype=_self.dtype)
+		_self.__local = local()
+
+	@staticmethod
+	def from_model(_model: LinearRegression | Ridge | Lasso, _dtype: str = 'float64'):
+		'''Predict with the coefficients of a fitted model, they are only copied when converted to another type.'''
+		return LinearPredictor(np.atleast_2d(_model.coef_).T, np.atleast_1d(_model.intercept_), _dtype)
+
+	@staticmethod
+	def stack(_predictors: list['LinearPredictor']):
+		'''One predictor that gives the predictions of every predictor side by side, with a single multiplication.'''
+		return LinearPredictor(
+			np.hstack([predictor.coef for predictor in _predictors]),
+			np.concatenate([predictor.intercept for predictor in _predictors]),
+			_predictors[0].dtype.name
+		)
+
+	@property
+	def n_features_in_(_self):
+		return _self.coef.shape[0]
+
+	def predict(_self, _features: np.ndarray) -> np.ndarray:
+		'''Predict every row of the features into a new array.'''
+		result = np.asarray(_features, dtype=_self.dtype) @ _self.coef
+		result += _self.intercept
+		return result
+
+	def predict_buffered(_self, _features: np.ndarray) -> np.ndarray:
+		'''Predict every row of the features, small batches without allocating.
+
+		Small batches return a view of a buffer that the next prediction on the same thread overwrites,
+		so only for callers that are done with the result before predicting again.
+		'''
+		features = np.asarray(_features, dtype=_self.dtype)
+		rows = len(features)
+		if rows > LinearPredictor.buffer_rows:
+			result = features @ _self.coef
+		else:
+			buffer = getattr(_self.__local, 'buffer', None)
+			if buffer is None:
+				buffer = _self.__local.buffer = np.empty((LinearPredictor.buffer_rows, len(_self.intercept)), dtype=_self.dtype)
+			result = buffer[:rows]
+			np.matmul(features, _self.coef, out=result)
+		result += _self.intercept
+		return result
@@ -1,112 +1,179 @@
-from datetime import date, datetime
-from os import remove
+import time
+from datetime import date
+from os import remove, replace, truncate
 from pathlib import Path
+from shutil import rmtree
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from app.utils.location import Location
 from app.utils.paths import Paths
+from app.utils.settings import Settings
 
 
 class DataProcessor:
 	block_size = 13
+	epoch = date(2000, 1, 1)
+	# Levels of the index of the processed dataset, a day is the row Id of a Block of its Location
+	index_columns = ['Location', 'Block', 'Id']
+	# Types of every column of the processed dataset, so they never need to be inferred
+	column_dtypes = {
+		'MinTemp': 'float64',
+		'MaxTemp': 'float64',
+		'Rainfall': 'float64',
+		'WindGustSpeed': 'float64',
+		'WindSpeed9am': 'float64',
+		'WindSpeed3pm': 'float64',
+		'Humidity9am': 'float64',
+		'Humidity3pm': 'float64',
+		'Pressure9am': 'float64',
+		'Pressure3pm': 'float64',
+		'Cloud9am': 'float64',
+		'Cloud3pm': 'float64',
+		'Temp9am': 'float64',
+		'Temp3pm': 'float64',
+		'DayIndex': 'int32',
+		'Year': 'int16',
+		'Month': 'int8',
+		'Day': 'int8',
+		'LocationHash': 'int8'
+	}
+	# Columns of the processed dataset fed to the models for each day, in order
+	feature_columns = ['MinTemp', 'MaxTemp', 'Rainfall', 'WindGustSpeed', 'WindSpeed9am', 'WindSpeed3pm', 'Humidity9am', 'Humidity3pm', 'Pressure9am', 'Pressure3pm', 'Cloud9am', 'Cloud3pm', 'Temp9am', 'Temp3pm', 'DayIndex', 'Year', 'Month', 'LocationHash']
+	# Columns of the raw dataset that either has a large amount of missing data or are not suitable for machine learning
+	dropped_columns = ['Sunshine', 'Evaporation', 'WindGustDir', 'WindDir9am', 'WindDir3pm', 'RainToday', 'RainTomorrow']
+	# Columns of the raw dataset where missing values are interpolated from the rows around them
+	interpolated_columns = ['MinTemp', 'MaxTemp', 'Temp9am', 'Temp3pm', 'Rainfall', 'WindGustSpeed', 'WindSpeed9am', 'WindSpeed3pm', 'Humidity9am', 'Humidity3pm', 'Pressure9am', 'Pressure3pm']
+	# Values of the interpolated columns for a location that never reported them, roughly their means over the whole raw dataset
+	typical_values = {
+		'MinTemp': 12.2,
+		'MaxTemp': 23.2,
+		'Temp9am': 17.0,
+		'Temp3pm': 21.7,
+		'Rainfall': 2.4,
+		'WindGustSpeed': 40.0,
+		'WindSpeed9am': 14.0,
+		'WindSpeed3pm': 18.7,
+		'Humidity9am': 68.9,
+		'Humidity3pm': 51.5,
+		'Pressure9am': 1017.6,
+		'Pressure3pm': 1015.3
+	}
 
 	@staticmethod
-	def process_data():
-		print('Processing data.')
-		data = pd.read_csv(Paths.raw_dataset)
-		# Remove columns that either has a large amount of missing data or are not suitable for machine learning
-		data.drop(columns=['Sunshine', 'Evaporation', 'WindGustDir', 'WindDir9am', 'WindDir3pm', 'RainToday', 'RainTomorrow'], inplace=True)
+	def date_to_day_index(_date: date) -> int:
+		'''Converts a date into the number of days since 2000-01-01'''
+		return (_date - DataProcessor.epoch).days
 
-		# Fill missing data
-		data.fillna({'MinTemp': data['MinTemp'].interpolate()}, inplace=True)
-		data.fillna({'MaxTemp': data['MaxTemp'].interpolate()}, inplace=True)
-		data.fillna({'Temp9am': data['Temp9am'].interpolate()}, inplace=True)
-		data.fillna({'Temp3pm': data['Temp3pm'].interpolate()}, inplace=True)
-		data.fillna({'Rainfall': data['Rainfall'].interpolate()}, inplace=True)
-		data.fillna({'WindGustSpeed': data['WindGustSpeed'].interpolate()}, inplace=True)
-		data.fillna({'WindSpeed9am': data['WindSpeed9am'].interpolate()}, inplace=True)
-		data.fillna({'WindSpeed3pm': data['WindSpeed3pm'].interpolate()}, inplace=True)
-		data.fillna({'Humidity9am': data['Humidity9am'].interpolate()}, inplace=True)
-		data.fillna({'Humidity3pm': data['Humidity3pm'].interpolate()}, inplace=True)
-		data.fillna({'Pressure9am': data['Pressure9am'].interpolate()}, inplace=True)
-		data.fillna({'Pressure3pm': data['Pressure3pm'].interpolate()}, inplace=True)
-		# Cloud9am and Cloud3pm have too many missing values to properly interpolate, assume NaN means no cloud cover
-		data.fillna({'Cloud9am': 0}, inplace=True)
-		data.fillna({'Cloud3pm': 0}, inplace=True)
+	@staticmethod
+	def reconfigure(_df: pd.DataFrame, _block_size=5, _state: dict | None = None):
+		'''Splits the rows into blocks up to a max size defined by Model_Settings.block_size. Blocks are per location. Uses Location, Date, Block, and Id as the labels for a multiIndex DataFrame.
 
-		def to_iso_date(_date: str) -> str:
-			'''Converts the date from dd-mm-yyyy to yyyy-mm-dd'''
-			return datetime.strptime(_date, '%d-%m-%Y').strftime("%Y-%m-%d")
+		When the rows are given in chunks, _state carries the DayIndex, Id and Block of the last row of every location from one chunk to the next. It is updated in place.
+		'''
+		# Block sizes needs to be incremented once before use
+		_block_size += 1
+
+		# A run is a sequence of consecutive days within a location, a new one starts on any gap
+		day_gap = _df['DayIndex'].groupby(_df['Location'], sort=False).diff()
+		previous = None
+		if _state:
+			previous = pd.DataFrame.from_dict(_state, orient='index', columns=['DayIndex', 'Id', 'Block'])
+			# The first row of a location in this chunk follows on from its last row in the previous one
+			day_gap = day_gap.fillna(_df['DayIndex'] - _df['Location'].map(previous['DayIndex']))
+		# Runs are numbered within each location, so the days of a location continue its own run wherever they are in the file
+		run = day_gap.ne(1).groupby(_df['Location'], sort=False).cumsum()
+		runs = [_df['Location'], run]
+		# Runs are cut into blocks of up to _block_size rows
+		position = run.groupby(runs, sort=False).cumcount()
+		if previous is not None:
+			# A run continued from the previous chunk starts counting where that chunk stopped
+			carried = (_df['Location'].map(previous['Id']) + 1).where(day_gap.eq(1) & _df['DayIndex'].groupby(_df['Location'], sort=False).cumcount().eq(0), 0)
+			position = position + carried.groupby(runs, sort=False).transform('first').astype('int64')
+		id = position % _block_size
+		block = id.eq(0).groupby(_df['Location'], sort=False).cumsum()
+		if previous is not None:
+			block = block + _df['Location'].map(previous['Block']).fillna(0).astype('int64')
+		if _state is not None:
+			last = pd.DataFrame({ 'DayIndex': _df['DayIndex'], 'Id': id, 'Block': block }).groupby(_df['Location'], sort=False).last()
+			_state.update({ location: (int(row[0]), int(row[1]), int(row[2])) for location, row in zip(last.index, last.to_numpy()) })
 
-		def convert_date_to_day_index(_date: str) -> int:
-			'''Converts the date into the number of days since 2000-01-01'''
-			delta = datetime.strptime(_date, '%Y-%m-%d').date() - date(2000, 1, 1)
-			return delta.days
+		# Create the multiIndex
+		index = pd.MultiIndex.from_arrays(
+			[_df['Location'], block, id],
+			names=['Location', 'Block', 'Id']
+		)
 
-		def extract_year(_date: str) -> int:
-			'''Returns the year component of the date'''
-			return datetime.strptime(_date, '%Y-%m-%d').year
+		# Removed unneeded columns and apply the multiIndex
+		stripped = _df.drop(columns=['Location'])
+		stripped.set_index(index, inplace=True)
+		return stripped
 
-		def extract_month(_date: str) -> int:
-			'''Returns the month component of the date'''
-			return datetime.strptime(_date, '%Y-%m-%d').month
+	@staticmethod
+	def fill_missing(_data: pd.DataFrame, _context: pd.DataFrame | None = None):
+		'''Fill the missing values of raw rows in place, every location from its own days.
 
-		def extract_day(_date: str) -> int:
-			'''Returns the day component of the date'''
-			return datetime.strptime(_date, '%Y-%m-%d').day
+		A missing value is interpolated between the known values around it, after the last known value of a location it is carried forward and before the first one carried back.
+		_context holds the raw days of locations whose earlier days were filled before, see last_known. The rows of those locations continue from them.
+		'''
+		columns = DataProcessor.interpolated_columns
+		rows = _data[['Location'] + columns]
+		earlier = 0
+		if _context is not None:
+			# Put the earlier days in front of each location so the gaps at its start are interpolated from them
+			context = _context.loc[_context['Location'].isin(rows['Location']), ['Location'] + columns]
+			rows = pd.concat([context, rows], ignore_index=True)
+			earlier = len(context)
+		filled = rows.groupby('Location', sort=False)[columns].transform(lambda _column: _column.interpolate(limit_direction='both'))
+		_data[columns] = filled.iloc[earlier:].to_numpy()
+		_data.fillna(DataProcessor.typical_values, inplace=True)
+		# Cloud9am and Cloud3pm have too many missing values to properly interpolate, assume NaN means no cloud cover
+		_data.fillna({'Cloud9am': 0}, inplace=True)
+		_data.fillna({'Cloud3pm': 0}, inplace=True)
 
-		data['Date'] = data['Date'].apply(to_iso_date)
+	@staticmethod
+	def last_known(_raw: pd.DataFrame):
+		'''Which raw rows of every location come at or after the earliest of the last known values of its interpolated columns.
+
+		The rows of every location must be in date order. Only these rows are needed to fill the missing values of the days after them.
+		'''
+		position = _raw.groupby('Location', sort=False).cumcount().to_numpy()
+		known = np.where(_raw[DataProcessor.interpolated_columns].notna().to_numpy(), position[:, None], -1)
+		last = pd.DataFrame(known).groupby(_raw['Location'].to_numpy(), sort=False).transform('max').to_numpy()
+		# A column that is never known does not need any of the rows
+		return position >= np.where(last >= 0, last, np.iinfo(np.int64).max).min(axis=1)
+
+	@staticmethod
+	def add_day_columns(_data: pd.DataFrame):
+		'''Replace the date of the raw dataset with the day and location columns, in place.'''
+		# Parse every date in one pass, the components are then read from it directly
+		dates = pd.to_datetime(_data['Date'], format='%d-%m-%Y')
 		# DayIndex is needed for reconfiguration, to validate sequenciality.
-		data['DayIndex'] = data['Date'].apply(convert_date_to_day_index)
-		data['Year'] = data['Date'].apply(extract_year)
-		data['Month'] = data['Date'].apply(extract_month)
-		data['Day'] = data['Date'].apply(extract_day)
+		_data['DayIndex'] = (dates - pd.Timestamp(DataProcessor.epoch)).dt.days
+		_data['Year'] = dates.dt.year
+		_data['Month'] = dates.dt.month
+		_data['Day'] = dates.dt.day
 		# Remove the date as it is not needed now
-		data.drop(columns=['Date'], inplace=True)
-
-		data['LocationHash'] = data['Location'].apply(Location.name_to_id)
-
-		def reconfigure(_df: pd.DataFrame, _block_size=5):
-			'''Splits the rows into blocks up to a max size defined by Model_Settings.block_size. Blocks are per location. Uses Location, Date, Block, and Id as the labels for a multiIndex DataFrame.'''
-			# Lists to store block and id number
-			block = []
-			id = []
-			# Block sizes needs to be incremented once before use
-			_block_size += 1
-
-			# Goes through every location
-			for _, group in _df.groupby('Location', sort=False):
-				block_num = 0
-				id_num = 0
-				prev = group['DayIndex'].iloc[0]
-
-				# Iterate over the DayIndex column
-				for _, index_num in group['DayIndex'].items():
-					# Check if a new block should be started
-					if id_num == _block_size or (index_num != prev + 1):
-						block_num += 1
-						id_num = 0  # Reset ID within the block
-
-					# Append the block number and ID within block to the lists
-					block.append(block_num)
-					id.append(id_num)
-
-					# Update variables for the next iteration
-					id_num += 1
-					prev = index_num
-
-			# Create the multiIndex
-			index = pd.MultiIndex.from_arrays(
-				[_df['Location'], block, id],
-				names=['Location', 'Block', 'Id']
-			)
-
-			# Removed unneeded columns and apply the multiIndex
-			stripped = _df.drop(columns=['Location'])
-			stripped.set_index(index, inplace=True)
-			return stripped
-
-		data = reconfigure(data, DataProcessor.block_size)
+		_data.drop(columns=['Date'], inplace=True)
+
+		_data['LocationHash'] = Location.names_to_ids(_data['Location'])
+
+	@staticmethod
+	def process_data():
+		if Settings.ingest_chunk_rows > 0:
+			return DataProcessor.process_data_chunked(Settings.ingest_chunk_rows)
+
+		print('Processing data.')
+		data = pd.read_csv(Paths.raw_dataset)
+		data.drop(columns=DataProcessor.dropped_columns, inplace=True)
+
+		# Fill missing data
+		DataProcessor.fill_missing(data)
+		DataProcessor.add_day_columns(data)
+
+		data = DataProcessor.reconfigure(data, DataProcessor.block_size)
 
 		def purge(_df: pd.DataFrame) -> pd.DataFrame:
 			'''Purge blocks with less than 10 elements in them.'''
@@ -114,23 +181,326 @@ class DataProcessor:
 			block_sizes = _df.groupby(['Location', 'Block'], sort=False).size()
 
 			# Identify unfit blocks (those with less than Model_Settings.block_size)
-			# Pylance mistakes this for an error
-			unfit = block_sizes[block_sizes < DataProcessor.block_size].index.to_list() # type: ignore
+			unfit = block_sizes[block_sizes < DataProcessor.block_size].index
 
-			# Boolean indexing to drop multiple combinations
-			df_filtered = _df[~(
-				_df.index.get_level_values('Location').isin([x[0] for x in unfit])
-				& _df.index.get_level_values('Block').isin([x[1] for x in unfit])
-			)]
-
-			return df_filtered
+			# Only the unfit blocks themselves, the same block number of another location may be complete
+			return _df[~_df.index.droplevel('Id').isin(unfit)]
 
 		data = purge(data)
-		data.to_csv(Paths.processed_dataset)
+		# Days appended to the raw dataset come after every location, they are put back with the rest of their location
+		data = data.iloc[DataProcessor.block_order(data)]
+		DataProcessor.save_processed(data.astype(DataProcessor.column_dtypes))
+		# Appended days are also in the raw dataset, so they are now part of the processed dataset
+		DataProcessor.remove_appended()
+
+	@staticmethod
+	def settle(_buffer: pd.DataFrame, _context: pd.DataFrame | None):
+		'''Split raw rows into the ones whose missing values can be filled now and the ones that wait for the next chunk.
+
+		Only the location of the last row can have more days in the next chunk. A missing value after its last known value of a column
+		is interpolated towards the next known value, which may be in a later chunk.
+		_context holds the raw days settled before that the next days of their location are filled from, see last_known.
+		Returns the filled rows that are settled, the rows to put in front of the next chunk with every value that is already certain filled in,
+		and the context with the settled rows.
+		'''
+		filled = _buffer.copy()
+		DataProcessor.fill_missing(filled, _context)
+		own = _buffer['Location'].eq(_buffer['Location'].iloc[-1])
+		# Position of the last known value of each column, without one every day of the location waits
+		last_known = [
+			_buffer.loc[own, column].last_valid_index()
+			for column in DataProcessor.interpolated_columns
+		]
+		cut = _buffer.index[own][0] if None in last_known else min(last_known)
+		waits = own & (_buffer.index >= cut)
+
+		waiting = filled[waits].copy()
+		for column, last in zip(DataProcessor.interpolated_columns, last_known):
+			# Values past the last known one were only carried forward, they are interpolated again once the next one is known
+			waiting.loc[waiting.index > (-1 if last is None else last), column] = float('nan')
+		for column in ('Cloud9am', 'Cloud3pm'):
+			waiting[column] = _buffer.loc[waits, column]
+		context = _buffer[~waits] if _context is None else pd.concat([_context, _buffer[~waits]], ignore_index=True)
+		return filled[~waits], waiting.reset_index(drop=True), context[DataProcessor.last_known(context)]
+
+	@staticmethod
+	def process_data_chunked(_chunk_rows: int):
+		'''Process the raw dataset a chunk of rows at a time, so memory does not grow with the size of the file.
+
+		Gives the same rows as reading the whole file at once. Missing values are interpolated across chunk boundaries
+		and the blocks of every location continue from one chunk to the next.
+		The rows are kept in the order of the raw dataset, so days appended to it stay after the other locations, see block_order.
+		Values carried forward at the end of a location are not interpolated again towards days appended after other locations.
+		The rows are first written to a staging file, the blocks that are too short are only known once every row is read.
+		'''
+		print(f'Processing data in chunks of {_chunk_rows} rows.')
+		staging = Paths.processed_dataset + '.staging.parquet'
+		state: dict[str, tuple[int, int, int]] = {}
+		# Raw days of every location that its days later in the file are filled from, see last_known
+		context = None
+		# Rows counted so far in the last block of every location, it may continue in the next chunk
+		open_blocks = pd.Series(dtype='int64', index=pd.MultiIndex.from_tuples([], names=['Location', 'Block']))
+		# Location and Block of every block purged for being too short, like purge in process_data
+		unfit: set[tuple[str, int]] = set()
+
+		def close_blocks(_sizes: pd.Series):
+			unfit.update(_sizes[_sizes < DataProcessor.block_size].index)
+
+		def settled(_rows: pd.DataFrame):
+			nonlocal open_blocks
+			DataProcessor.add_day_columns(_rows)
+			data = DataProcessor.reconfigure(_rows, DataProcessor.block_size, state)
+			sizes = data.groupby(['Location', 'Block'], sort=False).size().add(open_blocks, fill_value=0).astype('int64')
+			blocks = pd.Series(sizes.index.get_level_values('Block'), index=sizes.index)
+			is_last = blocks.eq(blocks.groupby(level='Location', sort=False).transform('max'))
+			close_blocks(sizes[~is_last])
+			open_blocks = sizes[is_last]
+			staged.write(data.astype(DataProcessor.column_dtypes))
+
+		with ProcessedWriter(staging) as staged:
+			waiting = None
+			for chunk in pd.read_csv(Paths.raw_dataset, chunksize=_chunk_rows):
+				chunk.drop(columns=DataProcessor.dropped_columns, inplace=True)
+				# Positions are used as the index, the chunks are numbered from where the previous one stopped
+				buffer = chunk.reset_index(drop=True) if waiting is None else pd.concat([waiting, chunk], ignore_index=True)
+				rows, waiting, context = DataProcessor.settle(buffer, context)
+				if len(rows):
+					settled(rows)
+			if waiting is not None and len(waiting):
+				# Nothing follows the last rows, so they are filled the same way as the end of the whole file
+				DataProcessor.fill_missing(waiting, context)
+				settled(waiting)
+		close_blocks(open_blocks)
+
+		try:
+			staged_file = pq.ParquetFile(staging)
+			with ProcessedWriter(Paths.processed_dataset) as output:
+				for group in range(staged_file.num_row_groups):
+					data = staged_file.read_row_group(group).to_pandas()
+					output.write(data[~data.index.droplevel('Id').isin(list(unfit))])
+		finally:
+			remove(staging)
+		DataProcessor.remove_appended()
+
+	@staticmethod
+	def append_observations(
+		_observations: pd.DataFrame,
+		_state: dict[str, tuple[int, int, int]],
+		_pending: pd.DataFrame
+	):
+		'''Process new days of raw data and add them to the processed dataset, without processing the rest of it again.
+
+		_observations has the columns of the raw dataset, every day must come after the last raw day of its location.
+		_state holds the DayIndex, Id and Block of the last processed row of every location, see reconfigure. It is updated in place.
+		_pending holds the raw days of every location that are not processed yet and the ones their missing values are filled from, see pending_days.
+		Missing values are filled like fill_missing and blocks are kept like purge in process_data does, so processing the data again
+		gives the same rows. Only a value carried forward past the last known one of a location is not interpolated again once a later one is known.
+		Returns the processed rows and the raw days that are pending now.
+		The new days are also written to the raw dataset, first, and removed again if the processed rows can not be saved, so the two stay the same.
+		'''
+		locations = set(_observations['Location'])
+		data = pd.concat([_pending[_pending['Location'].isin(locations)], _observations], ignore_index=True)
+		data.drop(columns=DataProcessor.dropped_columns, errors='ignore', inplace=True)
+		data = data.iloc[np.lexsort((pd.to_datetime(data['Date'], format='%d-%m-%Y').to_numpy(), data['Location'].to_numpy()))]
+		data.reset_index(drop=True, inplace=True)
+		raw = data.copy()
+
+		DataProcessor.fill_missing(data)
+		days = (pd.to_datetime(raw['Date'], format='%d-%m-%Y') - pd.Timestamp(DataProcessor.epoch)).dt.days
+		tails = raw['Location'].map({ location: tail[0] for location, tail in _state.items() })
+		# Days that are already processed only fill the missing values after them
+		data = data[(tails.isna() | (days > tails)).to_numpy()]
+		DataProcessor.add_day_columns(data)
+		data = DataProcessor.reconfigure(data, DataProcessor.block_size, dict(_state))
+		data = data[list(DataProcessor.column_dtypes)].astype(DataProcessor.column_dtypes)
+
+		# The processed days of a continued block count towards its size
+		sizes = data.groupby(['Location', 'Block'], sort=False).size()
+		stored = pd.Series(
+			[tail[1] + 1 for tail in _state.values()],
+			index=pd.MultiIndex.from_tuples([(location, tail[2]) for location, tail in _state.items()], names=['Location', 'Block']),
+			dtype='int64'
+		)
+		sizes = sizes + stored.reindex(sizes.index, fill_value=0)
+		# A block is only kept once it has block_size days, until then its days stay pending
+		data = data[data.index.droplevel('Id').isin(sizes[sizes >= DataProcessor.block_size].index)]
+		last = data.reset_index().groupby('Location', sort=False)[['DayIndex', 'Id', 'Block']].last()
+		_state.update({ location: (int(row[0]), int(row[1]), int(row[2])) for location, row in zip(last.index, last.to_numpy()) })
+		pending = pd.concat([
+			_pending[~_pending['Location'].isin(locations)],
+			DataProcessor.pending_days(raw, { location: tail[0] for location, tail in _state.items() })
+		], ignore_index=True)
+
+		size = DataProcessor.append_raw(_observations)
+		try:
+			if len(data):
+				directory = Path(Paths.processed_appends)
+				directory.mkdir(parents=True, exist_ok=True)
+				# Named by time so the files sort in the order they were added
+				DataProcessor.save_processed(data, f'{directory}/{time.time_ns():020d}{Path(Paths.processed_dataset).suffix}')
+		except BaseException:
+			if size is not None:
+				truncate(Paths.raw_dataset, size)
+			raise
+		return data, pending
+
+	@staticmethod
+	def append_raw(_observations: pd.DataFrame):
+		'''Add rows to the end of the raw dataset, in its column order. Nothing is written if there is no raw dataset.
+
+		Returns the size of the file before, to truncate it back to, or None if there is no raw dataset.
+		A failed write is truncated straight away.
+		'''
+		path = Path(Paths.raw_dataset)
+		if not path.is_file():
+			return None
+		columns = pd.read_csv(path, nrows=0).columns
+		size = path.stat().st_size
+		try:
+			with open(path, 'rb+') as file:
+				file.seek(0, 2)
+				if file.tell() > 0:
+					file.seek(-1, 2)
+					if file.read(1) != b'\n':
+						file.write(b'\n')
+			_observations.reindex(columns=columns).to_csv(path, mode='a', header=False, index=False, na_rep='NA')
+		except BaseException:
+			truncate(path, size)
+			raise
+		return size
+
+	@staticmethod
+	def pending_days(_raw: pd.DataFrame, _tails: dict[str, int]):
+		'''The raw days that a later day of their location is processed with, in their order.
+
+		These are the days after the given DayIndex of their location, every day of a location that is not given,
+		and the days before them that are needed to fill their missing values, see last_known.
+		After the last processed day of every location, the days are in a block purged for being too short, it may still be completed.
+		'''
+		days = (pd.to_datetime(_raw['Date'], format='%d-%m-%Y') - pd.Timestamp(DataProcessor.epoch)).dt.days
+		tails = _raw['Location'].map(_tails)
+		keep = (tails.isna() | (days > tails)).to_numpy(copy=True)
+		keep[~keep] = DataProcessor.last_known(_raw[~keep])
+		return _raw[keep]
+
+	@staticmethod
+	def read_pending(_tails: dict[str, int]):
+		'''The pending days of the raw dataset, see pending_days.'''
+		pending = pd.DataFrame(columns=['Date', 'Location'])
+		path = Path(Paths.raw_dataset)
+		if not path.is_file():
+			return pending
+		chunks = pd.read_csv(path, chunksize=Settings.ingest_chunk_rows) if Settings.ingest_chunk_rows > 0 else [pd.read_csv(path)]
+		for index, chunk in enumerate(chunks):
+			chunk.drop(columns=DataProcessor.dropped_columns, inplace=True)
+			pending = DataProcessor.pending_days(chunk if index == 0 else pd.concat([pending, chunk], ignore_index=True), _tails)
+		return pending.reset_index(drop=True)
+
+	@staticmethod
+	def appended_files():
+		'''The files of appended days, oldest first.'''
+		return sorted(Path(Paths.processed_appends).glob(f'*{Path(Paths.processed_dataset).suffix}'))
+
+	@staticmethod
+	def remove_appended():
+		rmtree(Paths.processed_appends, ignore_errors=True)
+
+	@staticmethod
+	def block_order(_df: pd.DataFrame):
+		'''Row order that puts every block of a location together, locations in the order they first appear.
+
+		Processing the whole file at once writes the dataset in this order. Days appended to the raw or processed dataset come after
+		every location, this places them after the rows of their location.
+		'''
+		locations = pd.factorize(_df.index.get_level_values('Location'))[0]
+		return np.lexsort((
+			_df.index.get_level_values('Id').to_numpy(),
+			_df.index.get_level_values('Block').to_numpy(),
+			locations
+		))
+
+	@staticmethod
+	def save_processed(_df: pd.DataFrame, _path: str | None = None):
+		'''Write the processed dataset, the format is chosen by the file extension.'''
+		path = _path or Paths.processed_dataset
+		with Paths.replacing(path) as temporary:
+			match Path(path).suffix:
+				case '.parquet':
+					_df.to_parquet(temporary)
+				case '.feather':
+					# Feather can not store an index
+					_df.reset_index().to_feather(temporary)
+				case _:
+					_df.to_csv(temporary)
+
+	@staticmethod
+	def load_processed(_path: str | None = None) -> pd.DataFrame:
+		'''Read the processed dataset, the format is chosen by the file extension.
+
+		Without a path, the appended days are included after the rows of their location.
+		'''
+		if _path is not None:
+			return DataProcessor.read_processed(_path)
+		frames = [DataProcessor.read_processed(Paths.processed_dataset)]
+		frames.extend(DataProcessor.read_processed(str(path)) for path in DataProcessor.appended_files())
+		if len(frames) == 1:
+			return frames[0]
+		data = pd.concat(frames)
+		return data.iloc[DataProcessor.block_order(data)]
+
+	@staticmethod
+	def read_processed(_path: str) -> pd.DataFrame:
+		'''Read one processed dataset file, the format is chosen by the file extension.'''
+		path = _path
+		match Path(path).suffix:
+			case '.parquet':
+				return pd.read_parquet(path)
+			case '.feather':
+				return pd.read_feather(path).set_index(DataProcessor.index_columns)
+			case _:
+				return pd.read_csv(
+					path,
+					index_col=[0, 1, 2],
+					dtype=DataProcessor.column_dtypes,
+					memory_map=True
+				)
+
+	@staticmethod
+	def guarantee_export():
+		'''Write the processed dataset as a CSV file if it is missing or older than the dataset.
+
+		Returns the path of the CSV file.
+		'''
+		DataProcessor.guarantee_data()
+		export = Path(Paths.processed_export)
+		changed = max(path.stat().st_mtime for path in [Path(Paths.processed_dataset), *DataProcessor.appended_files()])
+		if Paths.processed_export != Paths.processed_dataset and (
+			not export.is_file()
+			or export.stat().st_mtime < changed
+		):
+			print('Exporting processed data.')
+			DataProcessor.load_processed().to_csv(export)
+		return Paths.processed_export
+
+	@staticmethod
+	def processed_signature():
+		'''Identify the current processed dataset file by its path, modification time and size, and the names of the appended files.
+
+		Returns None if the file does not exist. Anything cached from the file is stale once this changes.
+		'''
+		try:
+			stat = Path(Paths.processed_dataset).stat()
+		except FileNotFoundError:
+			return None
+		return Paths.processed_dataset, stat.st_mtime_ns, stat.st_size, tuple(path.name for path in DataProcessor.appended_files())
 
 	@staticmethod
 	def remove_processed_data():
 		print(f'Removing processed data.')
+		# The export is only a copy, it does not count towards the result
+		if Path(Paths.processed_export).is_file() and Paths.processed_export != Paths.processed_dataset:
+			remove(Paths.processed_export)
+		DataProcessor.remove_appended()
 		try:
 			remove(Paths.processed_dataset)
 			return 'Dataset deleted'
@@ -146,3 +516,53 @@ class DataProcessor:
 		if not Path(Paths.processed_dataset).is_file():
 			print('Processed dataset file not found.')
 			DataProcessor.process_data()
+
+class ProcessedWriter():
+	'''Writes the processed dataset a chunk at a time, the format is chosen by the file extension.
+
+	Like DataProcessor.save_processed the chunks go to a temporary file, which replaces the dataset once the writer is closed without an error.
+	'''
+	def __init__(_self, _path: str):
+		'''Initial creation of the object.'''
+		_self.path = _path
+		_self.temporary = _path + '.tmp'
+		_self.format = Path(_path).suffix
+		_self.__writer: pq.ParquetWriter | pa.ipc.RecordBatchFileWriter | None = None
+		_self.__schema: pa.Schema | None = None
+		_self.__rows = 0
+
+	def write(_self, _df: pd.DataFrame):
+		match _self.format:
+			case '.parquet' | '.feather':
+				# Feather can not store an index
+				table = pa.Table.from_pandas(
+					_df.reset_index() if _self.format == '.feather' else _df,
+					schema=_self.__schema,
+					preserve_index=_self.format != '.feather'
+				)
+				if _self.__writer is None:
+					# Every later chunk is converted to the types of the first one
+					_self.__schema = table.schema
+					_self.__writer = pq.ParquetWriter(_self.temporary, table.schema) if _self.format == '.parquet' else pa.ipc.new_file(_self.temporary, table.schema)
+				_self.__writer.write_table(table)
+			case _:
+				_df.to_csv(_self.temporary, mode='a' if _self.__rows else 'w', header=not _self.__rows)
+		_self.__rows += len(_df)
+
+	def close(_self):
+		if _self.__writer is not None:
+			_self.__writer.close()
+			_self.__writer = None
+
+	def __enter__(_self):
+		return _self
+
+	def __exit__(_self, _type, _value, _traceback):
+		_self.close()
+		if _type is not None:
+			if Path(_self.temporary).is_file():
+				remove(_self.temporary)
+			return
+		if not Path(_self.temporary).is_file():
+			raise ValueError(f'Nothing was written to {_self.path}')
+		replace(_self.temporary, _self.path)
@@ -1,26 +1,58 @@
+import asyncio
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from datetime import date
+from threading import Lock
 
 import app.core.model as wm
+import numpy as np
+from app.core.data_index import DataIndex
+from app.core.jobs import JobManager
 from app.core.process_data import DataProcessor
+from app.utils.location import Location
+from app.utils.metrics import Metrics
 from app.utils.paths import Paths
-from fastapi import FastAPI, HTTPException, Request
+from app.utils.settings import Settings
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 import os
 
 
 #=== SETUP ===
 
-manager = wm.ModelManager()
+executor = ThreadPoolExecutor(max_workers=Settings.worker_threads, thread_name_prefix='worker')
+manager = wm.ModelManager(executor)
+data_index = DataIndex()
+# Jobs have threads of their own, so training never takes the threads that serve requests
+job_executor = ThreadPoolExecutor(max_workers=Settings.job_threads, thread_name_prefix='job')
+jobs = JobManager(job_executor, Settings.job_history)
+# Keeps the dataset, the index and the cached split in step while days are appended
+append_lock = Lock()
+
+async def run_blocking(_func, *_args):
+	'''Run blocking work in the worker threads so other requests are not held up.'''
+	return await asyncio.get_running_loop().run_in_executor(executor, _func, *_args)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 	# Startup
 	DataProcessor.guarantee_data()
-	manager.guarantee()
+	data_index.build()
+	# Load or train every model at the same time, they share one import of the dataset
+	warmups = [
+		jobs.submit(f'Warm up {_type.value}', warm_up, _type)
+		for _type in wm.ModelType
+	]
+	pending = {asyncio.wrap_future(job.future) for job in warmups} # type: ignore
+	# Start serving once any model is ready, the others keep loading in the background
+	while pending and not manager.ready():
+		_, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
 	yield
 	# Shutdown
+	executor.shutdown(wait=False, cancel_futures=True)
+	job_executor.shutdown(wait=False, cancel_futures=True)
 
 app = FastAPI(lifespan=lifespan)
 
@@ -35,13 +67,20 @@ app.add_middleware(
 
 @app.middleware('http')
 async def log_requests(request: Request, call_next):
-	'''Log HTTP requests into the console.'''
-	start_time = time.time()
+	'''Record the duration of HTTP requests in the metrics.'''
+	request.state.received = time.perf_counter()
 	response = await call_next(request)
-	process_time = time.time() - start_time
-	print(f'Request: {request.url} - Duration: {process_time} seconds')
+	process_time = time.perf_counter() - request.state.received
+	# Use the path template so every location or id does not become its own series
+	route = request.scope.get('route')
+	path = route.path if route is not None else 'unmatched'
+	Metrics.requests.observe(process_time, request.method, path, str(response.status_code))
 	return response
 
+def record_validation(_request: Request, _model: str):
+	'''Record the time from receiving a request until its body was parsed and validated.'''
+	Metrics.stages.observe(time.perf_counter() - _request.state.received, 'validation', _model)
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
 	'''Handle HTTP exceptions.'''
@@ -52,6 +91,23 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 #=== API PATHS ===
 
+@app.get('/metrics')
+async def metrics():
+	'''Timings and counters in the Prometheus text format.'''
+	return PlainTextResponse(Metrics.render(), media_type='text/plain; version=0.0.4')
+
+@app.get('/health')
+async def health():
+	'''Report which models are ready, the status is 503 until at least one is.'''
+	ready = manager.ready()
+	return JSONResponse(
+		status_code=200 if ready else 503,
+		content={ 'Result': {
+			'Ready': len(ready) > 0,
+			'Models': {_type.value: _type in ready for _type in wm.ModelType}
+		} }
+	)
+
 @app.get('/')
 async def root():
 	'''Displays a message when viewing the root of the website.'''
@@ -61,21 +117,76 @@ async def root():
 			'Path': Paths.api_path + '/models/{type}/evaluate',
 			'Description': 'Evaluate the chosen weather model.'
 		},
+		'Metrics': {
+			'Type': 'GET',
+			'Path': '/metrics',
+			'Description': 'Timings and counters in the Prometheus text format.'
+		},
+		'Health': {
+			'Type': 'GET',
+			'Path': '/health',
+			'Description': 'Report which models are ready.'
+		},
+		'Prediction cache': {
+			'Type': 'GET',
+			'Path': Paths.api_path + '/models/cache',
+			'Description': 'Report the size and hit ratio of the prediction cache of every model type.'
+		},
 		'Prediction with model test': {
 			'Type': 'GET',
 			'Path': Paths.api_path + '/models/{type}/predict-test',
 			'Description': 'A test prediction for validation.'
 		},
+		'Forecast tables': {
+			'Type': 'GET',
+			'Path': Paths.api_path + '/models/forecasts',
+			'Description': 'Report the size and versions of the forecast table of every model type.'
+		},
+		'Get job': {
+			'Type': 'GET',
+			'Path': Paths.api_path + '/jobs/{id}',
+			'Description': 'Report the status of a background job.'
+		},
 		'Get dataset': {
 			'Type': 'GET',
 			'Path': Paths.api_path + '/data',
 			'Description': 'Return the entire processed dataset.'
 		},
+		'Get location data': {
+			'Type': 'GET',
+			'Path': Paths.api_path + '/data/{location}?from={date}&to={date}',
+			'Description': 'Return the processed data of a location within a date range.'
+		},
 		'Predict with model': {
 			'Type': 'POST',
 			'Path': Paths.api_path + '/models/{type}/predict',
 			'Description': 'Request a result from a chosen weather model.'
 		},
+		'Predict with every model': {
+			'Type': 'POST',
+			'Path': Paths.api_path + '/models/all/predict?mean={bool}',
+			'Description': 'Request a result from every weather model at once, and optionally their mean.'
+		},
+		'Predict with model from numbers': {
+			'Type': 'POST',
+			'Path': Paths.api_path + '/models/{type}/predict-raw',
+			'Description': 'Request results for windows sent as a flat array of numbers, in JSON, raw float64 or .npy.'
+		},
+		'Predict with model by reference': {
+			'Type': 'POST',
+			'Path': Paths.api_path + '/models/{type}/predict-at',
+			'Description': 'Request a result for a location and date, using the stored days before it.'
+		},
+		'Predict batch with model': {
+			'Type': 'POST',
+			'Path': Paths.api_path + '/models/{type}/predict-batch',
+			'Description': 'Request results for many windows with a single call to the chosen weather model.'
+		},
+		'Append observations': {
+			'Type': 'POST',
+			'Path': Paths.api_path + '/data/observations?refit={bool}',
+			'Description': 'Add new days to the processed dataset, and optionally refit the linear and ridge models on them.'
+		},
 		'Process dataset': {
 			'Type': 'PUT',
 			'Path': Paths.api_path + '/data/process',
@@ -84,7 +195,17 @@ async def root():
 		'Train model': {
 			'Type': 'PUT',
 			'Path': Paths.api_path + '/models/{type}/train',
-			'Description': 'Manually train the chosen weather model.'
+			'Description': 'Start training the chosen weather model in the background.'
+		},
+		'Build forecast table': {
+			'Type': 'PUT',
+			'Path': Paths.api_path + '/models/{type}/forecasts',
+			'Description': 'Start predicting every stored location and date with the chosen weather model in the background.'
+		},
+		'Train location model': {
+			'Type': 'PUT',
+			'Path': Paths.api_path + '/models/{type}/train/{location}',
+			'Description': 'Start training the model of one location in the background, when location models are enabled.'
 		},
 		'Delete dataset': {
 			'Type': 'DELETE',
@@ -103,13 +224,26 @@ async def root():
 		}
 	} }
 
+@app.get(Paths.api_path + '/models/cache')
+async def model_cache():
+	'''Report the size and hit ratio of the prediction cache of every model type.'''
+	return { 'Result': manager.cache_stats() }
+
+@app.get(Paths.api_path + '/models/forecasts')
+async def model_forecasts():
+	'''Report the size and versions of the forecast table of every model type.
+
+	A table that is not current belongs to an older model or dataset and is not used.
+	'''
+	return { 'Result': manager.forecast_stats(data_index) }
+
 @app.get(Paths.api_path + '/models/{_type}/evaluate')
 async def model_evaluate(_type: wm.ModelType):
 	'''Evaluate the chosen weather model.
 
 	A model will be trained if it does not exist yet.
 	'''
-	return { 'Result': manager.oftype(_type).evaluate() }
+	return { 'Result': await run_blocking(manager.oftype(_type).evaluate) }
 
 @app.get(Paths.api_path + '/models/{_type}/predict-test')
 async def model_predict_test(_type: wm.ModelType):
@@ -118,7 +252,7 @@ async def model_predict_test(_type: wm.ModelType):
 	A model will be trained if it does not exist yet.
 	'''
 	try:
-		return { 'Result' : manager.oftype(_type).predict(wm.PrerequisitData.test_data()) }
+		return { 'Result' : await run_blocking(manager.oftype(_type).predict, wm.PrerequisitData.test_data()) }
 	except Exception as e:
 		raise HTTPException(status_code=500, detail='Internal server error')
 
@@ -129,36 +263,269 @@ async def get_dataset():
 	This is really bad and I would like to remove this before submitting.
 	A better solution would be to request a location with a date range.
 	'''
-	return FileResponse(Paths.processed_dataset)
+	return FileResponse(await run_blocking(DataProcessor.guarantee_export), media_type='text/csv')
+
+@app.get(Paths.api_path + '/data/{_location}')
+async def get_location_data(
+	_location: Location,
+	_from: date | None = Query(None, alias='from', description='First date to include (yyyy-mm-dd).'),
+	_to: date | None = Query(None, alias='to', description='Last date to include (yyyy-mm-dd).')
+):
+	'''Return the processed data of a location within a date range.
+
+	Both ends of the range are inclusive and optional.
+	'''
+	return { 'Result': await run_blocking(data_index.query, _location, _from, _to) }
+
+# Declared before the paths of a single model, which would otherwise take 'all' as the model type
+@app.post(Paths.api_path + '/models/all/predict')
+async def model_predict_all(
+	_prerequisit: wm.PrerequisitData,
+	_request: Request,
+	_mean: bool = Query(False, alias='mean', description='Also return the mean of the predictions.')
+):
+	'''Request a result from every weather model at once.
+
+	The window is validated and flattened once for all of them.
+	Models will be trained if they do not exist yet.
+	'''
+	record_validation(_request, 'all')
+	try:
+		return { 'Result' : await run_blocking(manager.predict_all, _prerequisit, _mean) }
+	except Exception as e:
+		raise HTTPException(status_code=500, detail='Internal server error')
 
 @app.post(Paths.api_path + '/models/{_type}/predict')
-async def model_predict(_type: wm.ModelType, _prerequisit: wm.PrerequisitData):
+async def model_predict(_type: wm.ModelType, _prerequisit: wm.PrerequisitData, _request: Request):
 	'''Request a result from a chosen weather model.
 
 	A model will be trained if it does not exist yet.
 	'''
+	record_validation(_request, _type.value)
+	with Metrics.stage('feature_build', _type.value):
+		features = _prerequisit.tolist()
 	try:
-		return { 'Result' : manager.oftype(_type).predict(_prerequisit) }
+		return { 'Result' : await manager.oftype(_type).predict_features_async(features, run_blocking) }
 	except Exception as e:
 		raise HTTPException(status_code=500, detail='Internal server error')
 
+@app.post(
+	Paths.api_path + '/models/{_type}/predict-raw',
+	openapi_extra={ 'requestBody': { 'required': True, 'content': {
+		'application/json': { 'schema': { 'type': 'array', 'items': { 'type': 'number' } } },
+		'application/octet-stream': { 'schema': { 'type': 'string', 'format': 'binary' } },
+		'application/x-npy': { 'schema': { 'type': 'string', 'format': 'binary' } }
+	} } }
+)
+async def model_predict_raw(_type: wm.ModelType, _request: Request):
+	'''Request results for windows sent as plain numbers.
+
+	Every window is 13 days of the 18 fields of a day in order, with the location as its id.
+	The body is a JSON array, or little-endian float64 values as application/octet-stream, or a .npy file as application/x-npy.
+	The values are checked against the same limits as the predict path, all at once.
+	A model will be trained if it does not exist yet.
+	'''
+	body = await _request.body()
+	try:
+		features = wm.PrerequisitData.decode(body, _request.headers.get('content-type', 'application/json'))
+	except ValueError as e:
+		raise HTTPException(status_code=422, detail=str(e))
+	record_validation(_request, _type.value)
+	try:
+		return { 'Result' : await run_blocking(manager.oftype(_type).predict_batch, features) }
+	except Exception as e:
+		raise HTTPException(status_code=500, detail='Internal server error')
+
+@app.post(Paths.api_path + '/models/{_type}/predict-at')
+async def model_predict_at(_type: wm.ModelType, _reference: wm.ReferenceData, _request: Request):
+	'''Request a result for a location and date, using the stored days before it.
+
+	Dates in the forecast table of the model are looked up instead of predicted.
+	A model will be trained if it does not exist yet.
+	'''
+	record_validation(_request, _type.value)
+	forecast = manager.oftype(_type).forecast(data_index, _reference.Location, _reference.Date)
+	if forecast is not None:
+		return { 'Result': forecast }
+	with Metrics.stage('feature_build', _type.value):
+		# In the worker threads, the index may have to be built again after the dataset was deleted
+		features = await run_blocking(data_index.window, _reference.Location, _reference.Date)
+	if features is None:
+		raise HTTPException(status_code=404, detail='Not enough data before the requested date')
+	try:
+		return { 'Result' : await manager.oftype(_type).predict_features_async(features, run_blocking) }
+	except Exception as e:
+		raise HTTPException(status_code=500, detail='Internal server error')
+
+def reference_windows(_underlying, _references: list[wm.ReferenceData], _first: int):
+	'''Look up references in the forecast table of a model and build the windows of the others.
+
+	Returns the windows, the forecasts by their position in the results counted from _first, and the references without enough data.
+	'''
+	windows = []
+	forecasts = {}
+	missing = []
+	for position, reference in enumerate(_references, _first):
+		forecast = _underlying.forecast(data_index, reference.Location, reference.Date)
+		if forecast is not None:
+			forecasts[position] = forecast
+			continue
+		features = data_index.window(reference.Location, reference.Date)
+		if features is None:
+			missing.append(f'{reference.Location} {reference.Date}')
+		else:
+			windows.append(features)
+	return windows, forecasts, missing
+
+@app.post(Paths.api_path + '/models/{_type}/predict-batch')
+async def model_predict_batch(_type: wm.ModelType, _batch: wm.BatchData, _request: Request):
+	'''Request results for many windows with a single call to the chosen weather model.
+
+	Windows sent in full come first in the results, followed by the references in the order given.
+	References in the forecast table of the model are looked up, only the rest reach the model.
+	A model will be trained if it does not exist yet.
+	'''
+	record_validation(_request, _type.value)
+	underlying = manager.oftype(_type)
+	with Metrics.stage('feature_build', _type.value):
+		rows = [window.tolist() for window in _batch.Windows]
+		# In the worker threads, the index may have to be built again after the dataset was deleted
+		windows, forecasts, missing = await run_blocking(reference_windows, underlying, _batch.References, len(rows))
+		rows.extend(windows)
+	if missing:
+		raise HTTPException(status_code=404, detail='Not enough data before: ' + ', '.join(missing))
+	if not rows and not forecasts:
+		raise HTTPException(status_code=400, detail='No windows to predict')
+	try:
+		if rows:
+			columns = await run_blocking(underlying.predict_batch, np.concatenate(rows))
+		else:
+			columns = {name: [] for name in wm.ModelManager.result_digits}
+	except Exception as e:
+		raise HTTPException(status_code=500, detail='Internal server error')
+	for position, forecast in forecasts.items():
+		for name, values in columns.items():
+			values.insert(position, forecast[name])
+	return { 'Result': columns }
+
+def append_observations(_batch: wm.ObservationBatch, _refit: bool):
+	'''Add new days to the processed dataset and the cached split, and refit the loaded linear models on the windows they complete.'''
+	with append_lock:
+		signature = DataProcessor.processed_signature()
+		rows = data_index.append(_batch.toframe())
+		X, Y, target_days = data_index.completed_blocks(rows)
+		wm.ModelManager.extend_split(X, Y, target_days, signature)
+
+	result = { 'Rows': len(rows), 'Windows': len(X) }
+	if _refit:
+		train = ~wm.ModelManager.is_test_window(target_days)
+		result['Refitted'] = {
+			_type.value: manager.oftype(_type).refit(X[train], Y[train])
+			for _type in wm.ModelManager.refittable
+			if _type in manager.ready()
+		}
+	if len(rows) or _refit:
+		# The tables of every model are stale once the dataset changed
+		refresh_forecasts(manager.ready())
+	return result
+
+@app.post(Paths.api_path + '/data/observations')
+async def data_observations(
+	_batch: wm.ObservationBatch,
+	_refit: bool = Query(False, alias='refit', description='Refit the loaded linear and ridge models on the windows the days complete.')
+):
+	'''Add new days to the processed dataset without processing all of it again.
+
+	Every day must come after the last stored day of its location. The days are also added to the raw dataset.
+	Missing readings are interpolated from the days around them, or carried forward from the last stored day.
+	Days are only processed once their block has enough days, until then they are only in the raw dataset.
+	'''
+	try:
+		return { 'Result': await run_blocking(append_observations, _batch, _refit) }
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+
 @app.put(Paths.api_path + '/data/process')
 async def data_process():
 	'''Process the data to be used with the model.
 
 	Used for troubleshooting.
 	'''
-	DataProcessor.process_data()
+	await run_blocking(DataProcessor.process_data)
+	await run_blocking(data_index.build)
+	refresh_forecasts(manager.ready())
 	return { 'Result': 'Finished' }
 
-@app.put(Paths.api_path + '/models/{_type}/train')
+def train_and_evaluate(_type: wm.ModelType):
+	'''Train the chosen weather model and return its evaluation.
+
+	The forecast table of the new model is built afterwards in its own job.
+	'''
+	result = manager.oftype(_type).train()
+	refresh_forecasts([_type])
+	return result
+
+def warm_up(_type: wm.ModelType):
+	'''Load or train the chosen weather model, then load or build its forecast table in a job of its own.
+
+	The table job is only queued once the model is ready, so it never holds a thread waiting for the model.
+	'''
+	manager.oftype(_type).guarantee()
+	if Settings.forecast_table:
+		jobs.submit(f'Forecast {_type.value}', guarantee_forecasts, _type)
+
+def build_forecasts(_type: wm.ModelType):
+	'''Predict every stored location and date with the chosen weather model and keep the results.'''
+	return manager.oftype(_type).build_forecasts(data_index)
+
+def guarantee_forecasts(_type: wm.ModelType):
+	'''Load the forecast table of the chosen weather model, or build it if it belongs to an older model.'''
+	return manager.oftype(_type).guarantee_forecasts(data_index)
+
+def refresh_forecasts(_types: list[wm.ModelType]):
+	'''Queue a build of the forecast tables of the model types, a table is stale once its model or the dataset changes.'''
+	if Settings.forecast_table:
+		for _type in _types:
+			jobs.submit(f'Forecast {_type.value}', build_forecasts, _type)
+
+@app.put(Paths.api_path + '/models/{_type}/train', status_code=202)
 async def model_train(_type: wm.ModelType):
-	'''Manually train the chosen weather model.
+	'''Start training the chosen weather model in the background.
 
-	Used for troubleshooting.
+	Returns the training job, which can be followed with the jobs path.
+	Requests made while the model is already training return the existing job.
 	'''
-	manager.oftype(_type).train()
-	return { 'Result': 'Success' }
+	job = jobs.submit(f'Train {_type.value}', train_and_evaluate, _type)
+	return { 'Result': job.describe() }
+
+@app.put(Paths.api_path + '/models/{_type}/forecasts', status_code=202)
+async def model_build_forecasts(_type: wm.ModelType):
+	'''Start predicting every stored location and date with the chosen weather model in the background.
+
+	Tables are built after every training already, this builds one again, for example after days were appended.
+	'''
+	job = jobs.submit(f'Forecast {_type.value}', build_forecasts, _type)
+	return { 'Result': job.describe() }
+
+@app.put(Paths.api_path + '/models/{_type}/train/{_location}', status_code=202)
+async def model_train_location(_type: wm.ModelType, _location: Location):
+	'''Start training the location model of the chosen weather model in the background.
+
+	Only available when sharded models are enabled.
+	'''
+	if not Settings.sharded_models:
+		raise HTTPException(status_code=400, detail='Location models are not enabled')
+	location = Location.name_to_id(_location)
+	job = jobs.submit(f'Train {_type.value} {_location.value}', wm.ModelManager.train_shards, _type, [location])
+	return { 'Result': job.describe() }
+
+@app.get(Paths.api_path + '/jobs/{_id}')
+async def get_job(_id: str):
+	'''Report the status of a background job.'''
+	job = jobs.get(_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail='Job not found')
+	return { 'Result': job.describe() }
 
 @app.delete(Paths.api_path + '/data/delete')
 async def processed_dataset_delete():
@@ -166,6 +533,7 @@ async def processed_dataset_delete():
 
 	Used for troubleshooting.
 	'''
+	data_index.clear()
 	return { 'Result': DataProcessor.remove_processed_data() }
 
 @app.delete(Paths.api_path + '/models/{_type}/delete')
@@ -174,7 +542,7 @@ async def model_delete(_type: wm.ModelType):
 
 	Used for troubleshooting.
 	'''
-	return { 'Result': manager.delete(_type) }
+	return { 'Result': await run_blocking(manager.delete, _type) }
 
 @app.delete(Paths.api_path + '/delete_all')
 async def delete_all():
@@ -182,11 +550,12 @@ async def delete_all():
 
 	Used for troubleshooting.
 	'''
+	data_index.clear()
 	return { 'Result' : {
 		'Dataset' : DataProcessor.remove_processed_data(),
-		'Linear' : manager.delete(wm.ModelType.Linear),
-		'Ridge' : manager.delete(wm.ModelType.Ridge),
-		'Lasso' : manager.delete(wm.ModelType.Lasso),
+		'Linear' : await run_blocking(manager.delete, wm.ModelType.Linear),
+		'Ridge' : await run_blocking(manager.delete, wm.ModelType.Ridge),
+		'Lasso' : await run_blocking(manager.delete, wm.ModelType.Lasso),
 	} }
 
 
@@ -0,0 +1,138 @@
+'''Timings and counters of the hot paths, exposed in the Prometheus text format.'''
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+
+
+class Histogram():
+	'''Counts observations into cumulative buckets per set of label values.'''
+	def __init__(_self, _name: str, _help: str, _labels: tuple[str, ...], _buckets: tuple[float, ...]):
+		'''Initial creation of the object.'''
+		_self.name = _name
+		_self.help = _help
+		_self.labels = _labels
+		_self.buckets = _buckets
+		# Label values to bucket counts, the last count is for values above every bucket
+		_self.__counts: dict[tuple[str, ...], list[int]] = {}
+		_self.__sums: dict[tuple[str, ...], float] = {}
+		_self.__lock = Lock()
+
+	def observe(_self, _value: float, *_label_values: str):
+		index = bisect_left(_self.buckets, _value)
+		with _self.__lock:
+			counts = _self.__counts.get(_label_values)
+			if counts is None:
+				counts = _self.__counts[_label_values] = [0] * (len(_self.buckets) + 1)
+				_self.__sums[_label_values] = 0.0
+			counts[index] += 1
+			_self.__sums[_label_values] += _value
+
+	def render(_self):
+		lines = [f'# HELP {_self.name} {_self.help}', f'# TYPE {_self.name} histogram']
+		with _self.__lock:
+			series = [(values, list(counts), _self.__sums[values]) for values, counts in _self.__counts.items()]
+		for values, counts, total in series:
+			labels = Metrics.format_labels(_self.labels, values)
+			prefix = labels + ',' if labels else ''
+			cumulative = 0
+			for bound, count in zip(_self.buckets, counts):
+				cumulative += count
+				lines.append(f'{_self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+			cumulative += counts[-1]
+			lines.append(f'{_self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+			lines.append(f'{_self.name}_sum{{{labels}}} {total}')
+			lines.append(f'{_self.name}_count{{{labels}}} {cumulative}')
+		return lines
+
+class Counter():
+	'''A running total per set of label values.'''
+	def __init__(_self, _name: str, _help: str, _labels: tuple[str, ...]):
+		'''Initial creation of the object.'''
+		_self.name = _name
+		_self.help = _help
+		_self.labels = _labels
+		_self.__totals: dict[tuple[str, ...], float] = {}
+		_self.__lock = Lock()
+
+	def inc(_self, _amount: float, *_label_values: str):
+		with _self.__lock:
+			_self.__totals[_label_values] = _self.__totals.get(_label_values, 0) + _amount
+
+	def render(_self):
+		lines = [f'# HELP {_self.name} {_self.help}', f'# TYPE {_self.name} counter']
+		with _self.__lock:
+			totals = list(_self.__totals.items())
+		for values, total in totals:
+			lines.append(f'{_self.name}{{{Metrics.format_labels(_self.labels, values)}}} {total}')
+		return lines
+
+class Metrics():
+	'''Process wide collection of every metric.'''
+	buckets = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+	requests = Histogram(
+		'weather_request_duration_seconds',
+		'Time spent handling HTTP requests.',
+		('method', 'path', 'status'),
+		buckets
+	)
+	stages = Histogram(
+		'weather_stage_duration_seconds',
+		'Time spent in each stage of serving a model request.',
+		('stage', 'model'),
+		buckets
+	)
+	model_requests = Counter(
+		'weather_model_requests_total',
+		'Requests handled by each model type.',
+		('model', 'action')
+	)
+	predictions = Counter(
+		'weather_predictions_total',
+		'Rows predicted by each model type.',
+		('model',)
+	)
+	batch_sizes = Histogram(
+		'weather_micro_batch_rows',
+		'Rows predicted together by the micro-batcher.',
+		('model',),
+		(1, 2, 4, 8, 16, 32, 64, 128, 256)
+	)
+	forecast_lookups = Counter(
+		'weather_forecast_lookups_total',
+		'Locations and dates looked up in the forecast table of each model type.',
+		('model', 'result')
+	)
+	prediction_cache = Counter(
+		'weather_prediction_cache_total',
+		'Rows looked up in the prediction cache of each model type.',
+		('model', 'result')
+	)
+
+	@staticmethod
+	@contextmanager
+	def stage(_stage: str, _model: str):
+		'''Time the body of the with statement as a stage of a model request.'''
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			Metrics.stages.observe(time.perf_counter() - start, _stage, _model)
+
+	@staticmethod
+	def format_labels(_names: tuple[str, ...], _values: tuple[str, ...]):
+		'''The labels of a series, with backslashes and quotes in the values escaped.'''
+		pairs = []
+		for name, value in zip(_names, _values):
+			escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+			pairs.append(f'{name}="{escaped}"')
+		return ','.join(pairs)
+
+	@staticmethod
+	def render():
+		'''Every metric in the Prometheus text format.'''
+		lines = []
+		for metric in (Metrics.requests, Metrics.stages, Metrics.model_requests, Metrics.predictions, Metrics.prediction_cache, Metrics.forecast_lookups, Metrics.batch_sizes):
+			lines.extend(metric.render())
+		return '\n'.join(lines) + '\n'
@@ -1,7 +1,35 @@
+from contextlib import contextmanager
+from os import replace
+from pathlib import Path
+
+
 class Paths():
 	api_path = '/api/v1/endpoints'
 	raw_dataset = './app/models/weatherAUS.csv'
-	processed_dataset = './app/models/weatherAUS_processed.csv'
+	# The format of the processed dataset is chosen by its extension: .parquet, .feather or .csv
+	processed_dataset = './app/models/weatherAUS_processed.parquet'
+	processed_export = './app/models/weatherAUS_processed.csv'
+	# Holds the processed days added since the dataset was last processed, one file per append
+	processed_appends = './app/models/weatherAUS_appended'
 	linear_model = './app/models/linear_model.pkl'
 	ridge_model = './app/models/ridge_model.pkl'
 	lasso_model = './app/models/lasso_model.pkl'
+	# Holds the predictions of every window of the dataset, one file per model type
+	forecast_directory = './app/models/forecasts'
+	# Holds a folder per model type with one model file per location
+	shard_directory = './app/models/shards'
+
+	@staticmethod
+	@contextmanager
+	def replacing(_path: str):
+		'''Give a temporary path to write to, which replaces the path once the with statement finishes without an error.
+
+		Readers, also in other workers, never see a partly written file.
+		'''
+		temporary = _path + '.tmp'
+		try:
+			yield temporary
+		except BaseException:
+			Path(temporary).unlink(missing_ok=True)
+			raise
+		replace(temporary, _path)
@@ -0,0 +1,31 @@
+from os import environ
+
+
+class Settings():
+	# Threads that run blocking data and model work so the event loop stays free
+	worker_threads = int(environ.get('WORKER_THREADS', 4))
+	# Threads that run background jobs such as training, kept apart from the worker threads so requests never wait behind them
+	job_threads = int(environ.get('JOB_THREADS', 3))
+	# How many finished background jobs are remembered for status requests
+	job_history = int(environ.get('JOB_HISTORY', 100))
+	# Also train one model per location and route predictions to them by location
+	sharded_models = environ.get('SHARDED_MODELS', '0') == '1'
+	# Processes that train the location models in parallel, None uses every core
+	shard_processes = int(environ.get('SHARD_PROCESSES', 0)) or None
+	# Rows of the raw dataset read at a time when processing it, 0 reads the whole file at once
+	ingest_chunk_rows = int(environ.get('INGEST_CHUNK_ROWS', 0))
+	# Predictions remembered per model type, 0 turns the cache off
+	prediction_cache_size = int(environ.get('PREDICTION_CACHE_SIZE', 10000))
+	# Seconds a remembered prediction is used for, 0 keeps it until the model changes
+	prediction_cache_ttl = float(environ.get('PREDICTION_CACHE_TTL', 3600))
+	# Predict with the model coefficients directly instead of through scikit-learn
+	compiled_predictor = environ.get('COMPILED_PREDICTOR', '1') == '1'
+	# Precision of the compiled coefficients, float32 is faster but rounds the predictions
+	predictor_dtype = environ.get('PREDICTOR_DTYPE', 'float64')
+	# Predict every window of the dataset after training, so predictions for a stored location and date are lookups
+	forecast_table = environ.get('FORECAST_TABLE', '1') == '1'
+	# Predict single rows that arrive close together in one call to the model
+	micro_batching = environ.get('MICRO_BATCHING', '0') == '1'
+	# Milliseconds the first row of a batch waits for others, and the rows that start a batch straight away
+	batch_window_ms = float(environ.get('BATCH_WINDOW_MS', 2))
+	batch_rows = int(environ.get('BATCH_ROWS', 64))
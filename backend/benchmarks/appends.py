@@ -0,0 +1,83 @@
+'''Check that appending days and then processing the raw dataset again gives the same processed dataset.
+
+Every file is written to a temporary folder, the real datasets are not touched.
+
+Run from the backend folder:
+	python -m benchmarks.appends [scale] [batches]
+'''
+
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+from app.core.data_index import DataIndex
+from app.core.process_data import DataProcessor
+from app.utils.settings import Settings
+from benchmarks.suite import use_folder
+from benchmarks.synthetic import make_raw
+
+# Days at the end of every location that are appended instead of processed
+appended_days = 80
+
+def split_raw(_raw: pd.DataFrame, _batches: int, _seed: int = 0):
+	'''The raw days processed at first and the batches of days appended after them.
+
+	Every location is cut at random days, so the batches continue complete, short and purged blocks.
+	A value carried forward past the last day stored is not interpolated again, so the cuts are after days with every interpolated value.
+	'''
+	rng = np.random.default_rng(_seed)
+	known = _raw[DataProcessor.interpolated_columns].notna().all(axis=1).to_numpy()
+	base = []
+	batches = [[] for _ in range(_batches)]
+	for _, rows in _raw.groupby('Location', sort=False):
+		positions = np.flatnonzero(known[rows.index])
+		candidates = positions[(positions >= len(rows) - appended_days) & (positions < len(rows) - 1)]
+		cuts = np.sort(rng.choice(candidates, _batches, replace=False)) + 1
+		base.append(rows.iloc[:cuts[0]])
+		for batch, start, stop in zip(batches, cuts, [*cuts[1:], len(rows)]):
+			batch.append(rows.iloc[start:stop])
+	return pd.concat(base), [pd.concat(batch) for batch in batches]
+
+def processed(_chunk_rows: int):
+	'''Process the raw dataset and load it in block order.'''
+	Settings.ingest_chunk_rows = _chunk_rows
+	DataProcessor.process_data()
+	data = DataProcessor.load_processed()
+	return data.iloc[DataProcessor.block_order(data)]
+
+if __name__ == '__main__':
+	scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+	batch_count = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+	raw = make_raw(scale)
+	base, batches = split_raw(raw, batch_count)
+
+	with tempfile.TemporaryDirectory() as folder:
+		use_folder(folder)
+		raw.to_csv(f'{folder}/weatherAUS.csv', index=False, na_rep='NA')
+		expected = processed(0)
+
+		base.to_csv(f'{folder}/weatherAUS.csv', index=False, na_rep='NA')
+		processed(0)
+		index = DataIndex()
+		index.build()
+		for number, batch in enumerate(batches):
+			rows = index.append(batch)
+			print(f'Batch {number}: {len(batch)} days, {len(rows)} processed rows')
+		appended = DataProcessor.load_processed()
+
+		# The raw dataset now has the appended days after every location
+		results = {
+			'Appended': appended,
+			'Processed again': processed(0),
+			'Processed again in chunks': processed(5000)
+		}
+
+	matching = True
+	for name, result in results.items():
+		identical = result.equals(expected) and result.index.equals(expected.index)
+		matching &= identical
+		print(f'{name}: {len(result)} rows, identical: {identical}')
+	print(f'Expected: {len(expected)} rows')
+	if not matching:
+		sys.exit(1)
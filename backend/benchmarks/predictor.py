@@ -0,0 +1,56 @@
+'''Compare the compiled linear predictor against scikit-learn predictions, and time both on a single row.
+
+Run from the backend folder:
+	python -m benchmarks.predictor [training rows]
+'''
+
+import sys
+import time
+
+import numpy as np
+from app.core.model import ModelManager, ModelType
+from app.core.predictor import LinearPredictor
+
+# Largest difference allowed from the scikit-learn prediction, relative to its size
+tolerance = { 'float64': 1e-9, 'float32': 1e-4 }
+
+def make_data(_rows: int, _seed: int = 0):
+	'''Random windows and targets with the shape of the real ones.'''
+	rng = np.random.default_rng(_seed)
+	X = rng.normal(0, 1, (_rows, 234)) * rng.uniform(1, 1000, 234)
+	Y = X @ rng.normal(0, 0.01, (234, 18)) + rng.normal(0, 1, (_rows, 18))
+	return X, Y
+
+def latency(_predict, _row: np.ndarray, _repeat: int = 2000):
+	'''Median seconds of a prediction of one row.'''
+	durations = []
+	for _ in range(_repeat):
+		start = time.perf_counter()
+		_predict(_row)
+		durations.append(time.perf_counter() - start)
+	return float(np.median(durations))
+
+if __name__ == '__main__':
+	rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+	X, Y = make_data(rows)
+	X_test, _ = make_data(500, 1)
+
+	matching = True
+	for _type in ModelType:
+		model = ModelManager.create_model(_type).fit(X, Y)
+		expected = model.predict(X_test)
+		row = X_test[:1]
+		print(f'{_type.value}: scikit-learn {latency(model.predict, row) * 1e6:.1f} us')
+		for dtype, allowed in tolerance.items():
+			predictor = LinearPredictor.from_model(model, dtype)
+			# Both the buffered single rows and a full batch
+			result = np.concatenate([predictor.predict_buffered(X_test[index:index + 1]).copy() for index in range(len(X_test))])
+			error = max(
+				np.abs(result - expected).max(),
+				np.abs(predictor.predict(X_test) - expected).max()
+			) / np.abs(expected).max()
+			matching &= bool(error <= allowed)
+			print(f'{_type.value}: {dtype} {latency(predictor.predict_buffered, row) * 1e6:.1f} us, relative error {error:.1e}')
+	print(f'Matching: {matching}')
+	if not matching:
+		sys.exit(1)
@@ -0,0 +1,79 @@
+'''Compare the vectorized block assignment against the original row by row loop.
+
+Run from the backend folder:
+	python -m benchmarks.reconfigure [rows per location]
+'''
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from app.core.process_data import DataProcessor
+from app.utils.location import Location
+
+
+def reconfigure_loop(_df: pd.DataFrame, _block_size=5):
+	'''The original implementation of DataProcessor.reconfigure, kept as the reference result.'''
+	block = []
+	id = []
+	_block_size += 1
+
+	for _, group in _df.groupby('Location', sort=False):
+		block_num = 0
+		id_num = 0
+		prev = group['DayIndex'].iloc[0]
+
+		for _, index_num in group['DayIndex'].items():
+			if id_num == _block_size or (index_num != prev + 1):
+				block_num += 1
+				id_num = 0
+
+			block.append(block_num)
+			id.append(id_num)
+
+			id_num += 1
+			prev = index_num
+
+	index = pd.MultiIndex.from_arrays(
+		[_df['Location'], block, id],
+		names=['Location', 'Block', 'Id']
+	)
+
+	stripped = _df.drop(columns=['Location'])
+	stripped.set_index(index, inplace=True)
+	return stripped
+
+def make_frame(_rows: int, _seed=0):
+	'''A frame of every location with _rows days each and randomly missing days.'''
+	rng = np.random.default_rng(_seed)
+	frames = []
+	for location in Location:
+		days = np.arange(3000, 3000 + _rows)
+		days = days[rng.random(_rows) > 0.02]
+		frames.append(pd.DataFrame({
+			'Location': location.value,
+			'MinTemp': rng.normal(12, 5, len(days)),
+			'DayIndex': days
+		}))
+	return pd.concat(frames, ignore_index=True)
+
+def timed(_func, *_args):
+	start = time.perf_counter()
+	result = _func(*_args)
+	return result, time.perf_counter() - start
+
+if __name__ == '__main__':
+	rows = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+	frame = make_frame(rows)
+
+	expected, loop_time = timed(reconfigure_loop, frame, DataProcessor.block_size)
+	result, vector_time = timed(DataProcessor.reconfigure, frame, DataProcessor.block_size)
+
+	identical = expected.to_csv() == result.to_csv()
+	print(f'Rows: {len(frame)}')
+	print(f'Loop: {loop_time:.3f} seconds')
+	print(f'Vectorized: {vector_time:.3f} seconds')
+	print(f'Identical: {identical}')
+	if not identical:
+		sys.exit(1)
@@ -0,0 +1,46 @@
+'''Compare the vectorized feature and target split against the original groupby loop.
+
+Run from the backend folder:
+	python -m benchmarks.split [rows per location]
+'''
+
+import sys
+
+import numpy as np
+import pandas as pd
+from app.core.model import ModelManager
+from app.core.process_data import DataProcessor
+from benchmarks.reconfigure import make_frame, timed
+
+
+def split_loop(_df: pd.DataFrame):
+	'''The original implementation of ModelManager.split_into_features_and_target, kept as the reference result.'''
+	features_list = []
+	targets_list = []
+
+	for _, group in _df.groupby(['Location', 'Block'], sort=False):
+		features_list.append(group.iloc[:-1].values.flatten())
+		targets_list.append(group.iloc[-1:].values[0])
+
+	return np.array(features_list), np.array(targets_list)
+
+def make_blocks(_rows: int):
+	'''A reconfigured frame holding only complete blocks, which the original loop requires.'''
+	frame = DataProcessor.reconfigure(make_frame(_rows), DataProcessor.block_size)
+	sizes = frame.groupby(['Location', 'Block'], sort=False)['DayIndex'].transform('size')
+	return frame[sizes.to_numpy() == DataProcessor.block_size + 1]
+
+if __name__ == '__main__':
+	rows = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+	frame = make_blocks(rows)
+
+	(expected_X, expected_Y), loop_time = timed(split_loop, frame)
+	(result_X, result_Y), vector_time = timed(ModelManager.split_into_features_and_target, frame)
+
+	identical = np.array_equal(expected_X, result_X) and np.array_equal(expected_Y, result_Y)
+	print(f'Rows: {len(frame)}')
+	print(f'Loop: {loop_time:.3f} seconds')
+	print(f'Vectorized: {vector_time:.3f} seconds')
+	print(f'Identical: {identical}')
+	if not identical:
+		sys.exit(1)
@@ -0,0 +1,173 @@
+'''Time the preprocessing, training and prediction paths on a synthetic dataset.
+
+Every file is written to a temporary folder, the real datasets and models are not touched.
+The results are written as JSON so runs of different commits can be compared.
+
+Run from the backend folder:
+	python -m benchmarks.suite --scale 10 --output results.json
+'''
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from app.core.process_data import DataProcessor
+from app.utils.paths import Paths
+from app.utils.settings import Settings
+from benchmarks.synthetic import make_raw
+
+
+def timed(_func, *_args):
+	'''Run once and return the result and the seconds taken.'''
+	start = time.perf_counter()
+	result = _func(*_args)
+	return result, time.perf_counter() - start
+
+def repeated(_func, _repeat: int):
+	'''Run many times and summarise the seconds taken.'''
+	durations = []
+	for _ in range(_repeat):
+		durations.append(timed(_func)[1])
+	durations.sort()
+	return {
+		'Repeat': _repeat,
+		'Mean': statistics.fmean(durations),
+		'Min': durations[0],
+		'P50': durations[len(durations) // 2],
+		'P95': durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+	}
+
+def use_folder(_folder: str):
+	'''Point every file path at the folder.'''
+	Paths.raw_dataset = f'{_folder}/weatherAUS.csv'
+	Paths.processed_dataset = f'{_folder}/weatherAUS_processed.parquet'
+	Paths.processed_export = f'{_folder}/weatherAUS_processed.csv'
+	Paths.processed_appends = f'{_folder}/weatherAUS_appended'
+	Paths.linear_model = f'{_folder}/linear_model.pkl'
+	Paths.ridge_model = f'{_folder}/ridge_model.pkl'
+	Paths.lasso_model = f'{_folder}/lasso_model.pkl'
+	Paths.shard_directory = f'{_folder}/shards'
+	Paths.forecast_directory = f'{_folder}/forecasts'
+
+def references(_first: bool = True):
+	'''A predictable date for every location, the day after its first complete block, or after every complete block.'''
+	frame = DataProcessor.load_processed()
+	targets = frame[frame.index.get_level_values('Id') == DataProcessor.block_size]
+	days = targets.groupby(level='Location', sort=False)['DayIndex'].first() if _first else targets['DayIndex'].droplevel(['Block', 'Id'])
+	return [
+		{ 'Location': location, 'Date': str(DataProcessor.epoch + timedelta(days=int(day) + 1)) }
+		for location, day in days.items()
+	]
+
+def windows(_window: dict, _count: int):
+	'''Copies of a window that all differ, so none of them are answered from the prediction cache.'''
+	return [
+		{ **_window, 'Day0': { **_window['Day0'], 'MinTemp': _window['Day0']['MinTemp'] + index * 0.001 } }
+		for index in range(_count)
+	]
+
+def commit():
+	try:
+		return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def run(_scale: int, _repeat: int):
+	results = {
+		'Scale': _scale,
+		'Commit': commit(),
+		'Python': platform.python_version(),
+		'Timings': {}
+	}
+	timings = results['Timings']
+
+	with tempfile.TemporaryDirectory() as folder:
+		use_folder(folder)
+		raw, timings['Generate'] = timed(make_raw, _scale)
+		raw.to_csv(Paths.raw_dataset, index=False, na_rep='NA')
+		results['Raw rows'] = len(raw)
+		del raw
+
+		_, timings['Process data'] = timed(DataProcessor.process_data)
+		results['Processed rows'] = len(DataProcessor.load_processed())
+
+		# Imported after the paths are set, the app creates its objects on import
+		import app.core.model as wm
+		from app.main import app, build_forecasts
+		from app.main import manager as served
+		from fastapi.testclient import TestClient
+		# The tables are built and timed separately below
+		Settings.forecast_table = False
+
+		(X_train, X_test, _, _), timings['Import and split (cold)'] = timed(wm.ModelManager.import_and_split_data)
+		_, timings['Import and split (cached)'] = timed(wm.ModelManager.import_and_split_data)
+		results['Windows'] = len(X_train) + len(X_test)
+
+		manager = wm.ModelManager()
+		for _type in wm.ModelType:
+			_, timings[f'Train {_type.value}'] = timed(manager.oftype(_type).train)
+			_, timings[f'Evaluate {_type.value}'] = timed(manager.oftype(_type).evaluate)
+
+		window = wm.PrerequisitData.test_data().model_dump()
+		batch = { 'References': references() }
+		days = references(False)
+		results['Batch size'] = len(batch['References'])
+		with TestClient(app) as client:
+			for _type in wm.ModelType:
+				base = f'{Paths.api_path}/models/{_type.value}'
+				cache = served.oftype(_type).cache
+				capacity = cache.capacity
+				# Every request reaches the model, the cache is off and there is no table yet
+				cache.capacity = 0
+				different = itertools.cycle(windows(window, _repeat))
+				timings[f'Predict {_type.value}'] = repeated(
+					lambda: client.post(f'{base}/predict', json=next(different)).raise_for_status(),
+					_repeat
+				)
+				day = itertools.cycle(days)
+				timings[f'Predict at {_type.value}'] = repeated(
+					lambda: client.post(f'{base}/predict-at', json=next(day)).raise_for_status(),
+					_repeat
+				)
+				timings[f'Predict batch {_type.value}'] = repeated(
+					lambda: client.post(f'{base}/predict-batch', json=batch).raise_for_status(),
+					_repeat
+				)
+
+				cache.capacity = capacity
+				timings[f'Predict {_type.value} (cached)'] = repeated(
+					lambda: client.post(f'{base}/predict', json=window).raise_for_status(),
+					_repeat
+				)
+				_, timings[f'Build forecasts {_type.value}'] = timed(build_forecasts, _type)
+				timings[f'Predict at {_type.value} (forecast table)'] = repeated(
+					lambda: client.post(f'{base}/predict-at', json=next(day)).raise_for_status(),
+					_repeat
+				)
+				timings[f'Predict batch {_type.value} (forecast table)'] = repeated(
+					lambda: client.post(f'{base}/predict-batch', json=batch).raise_for_status(),
+					_repeat
+				)
+	return results
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--scale', type=int, default=1, help='Multiple of the size of the real dataset.')
+	parser.add_argument('--repeat', type=int, default=50, help='Requests sent for each prediction timing.')
+	parser.add_argument('--output', help='File to write the results to, printed if not given.')
+	arguments = parser.parse_args()
+
+	results = run(arguments.scale, arguments.repeat)
+	text = json.dumps(results, indent='\t')
+	if arguments.output:
+		with open(arguments.output, 'w') as file:
+			file.write(text + '\n')
+	else:
+		sys.stdout.write(text + '\n')
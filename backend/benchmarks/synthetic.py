@@ -0,0 +1,77 @@
+'''Generate a raw dataset shaped like weatherAUS.csv, so benchmarks do not need the real data.
+
+Run from the backend folder:
+	python -m benchmarks.synthetic [output path] [scale]
+'''
+
+import sys
+
+import numpy as np
+import pandas as pd
+from app.utils.location import Location
+
+# Roughly the span of the real dataset for each location
+days_per_station = 3000
+
+def station_days(_rng: np.random.Generator, _days: int):
+	'''Day offsets of a station, runs of consecutive days separated by short gaps.
+
+	Runs rarely end on a whole block and some are only a few days, so there are short blocks to purge, also at the end of a station.
+	'''
+	offsets = []
+	day = 0
+	while day < _days:
+		run = int(_rng.integers(1, 13)) if _rng.random() < 0.1 else int(_rng.integers(14, 420))
+		offsets.append(np.arange(day, min(day + run, _days)))
+		day += run + int(_rng.integers(1, 6))
+	return np.concatenate(offsets)
+
+def make_raw(_scale: int = 1, _seed: int = 0):
+	'''A raw dataset with the 49 locations and about 3000 days each for every unit of scale.
+
+	Scaling adds years to every location rather than more stations, so every row stays a known location.
+	Past a scale of about 30 the dates go beyond 2262, which needs the microsecond dates of pandas 3.
+	'''
+	rng = np.random.default_rng(_seed)
+	start = pd.Timestamp('2008-12-01')
+	frames = []
+	for name in [location.value for location in Location]:
+		offsets = station_days(rng, days_per_station * _scale)
+		rows = len(offsets)
+
+		def column(_mean: float, _spread: float, _missing: float = 0.02, _low: float | None = None, _high: float | None = None):
+			values = rng.normal(_mean, _spread, rows).clip(_low, _high).round(1)
+			values[rng.random(rows) < _missing] = np.nan
+			return values
+
+		frames.append(pd.DataFrame({
+			'Date': (start + pd.to_timedelta(offsets, 'D')).strftime('%d-%m-%Y'),
+			'Location': name,
+			'MinTemp': column(12, 6),
+			'MaxTemp': column(23, 7),
+			'Rainfall': column(2, 8, _low=0),
+			'Evaporation': column(5, 4, 0.4, _low=0),
+			'Sunshine': column(7, 4, 0.5, _low=0),
+			'WindGustDir': rng.choice(['N', 'E', 'S', 'W'], rows),
+			'WindGustSpeed': column(40, 13, 0.07, _low=0),
+			'WindDir9am': rng.choice(['N', 'E', 'S', 'W'], rows),
+			'WindDir3pm': rng.choice(['N', 'E', 'S', 'W'], rows),
+			'WindSpeed9am': column(14, 9, _low=0),
+			'WindSpeed3pm': column(18, 9, _low=0),
+			'Humidity9am': column(68, 19, _low=0, _high=100),
+			'Humidity3pm': column(51, 21, 0.03, _low=0, _high=100),
+			'Pressure9am': column(1017, 7, 0.1),
+			'Pressure3pm': column(1015, 7, 0.1),
+			'Cloud9am': column(4, 3, 0.38, _low=0, _high=9),
+			'Cloud3pm': column(4, 3, 0.4, _low=0, _high=9),
+			'Temp9am': column(17, 6),
+			'Temp3pm': column(21, 7),
+			'RainToday': rng.choice(['No', 'Yes'], rows),
+			'RainTomorrow': rng.choice(['No', 'Yes'], rows)
+		}))
+	return pd.concat(frames, ignore_index=True)
+
+if __name__ == '__main__':
+	path = sys.argv[1] if len(sys.argv) > 1 else 'weatherAUS_synthetic.csv'
+	scale = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+	make_raw(scale).to_csv(path, index=False, na_rep='NA')
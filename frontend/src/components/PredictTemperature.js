@@ -1,7 +1,7 @@
 import React, { useEffect, useState, useRef } from 'react';
 import * as d3 from 'd3';
 import axios from 'axios';
-import { parseCsvData, buildPredictPayload } from '../components/predictPayloadStructure';
+import { parseCsvData, buildPredictPayload, toIsoDate } from '../components/predictPayloadStructure';
 import '../components/styles.css';
 
 const PredictTemperature = ({ selectedDate, selectedLocation }) => {
@@ -17,18 +17,12 @@ const PredictTemperature = ({ selectedDate, selectedLocation }) => {
     const startDate = new Date(endDate);
     startDate.setDate(endDate.getDate() - 14);
 
-    const dataResponse = await d3.csv("http://localhost:8000/data/weatherAUS_processed.csv");
+    const dataResponse = await axios.get(
+      `http://localhost:8000/api/v1/endpoints/data/${location}`,
+      { params: { from: toIsoDate(startDate), to: toIsoDate(endDate) } }
+    );
 
-    const filteredData = dataResponse.filter((row) => {
-      const rowDate = new Date(`${row.Year}-${row.Month}-${row.Day}`);
-      return (
-        row.Location === location &&
-        rowDate >= startDate &&
-        rowDate <= endDate
-      );
-    });
-
-    const parsedData = parseCsvData(filteredData);
+    const parsedData = parseCsvData(dataResponse.data.Result);
     setData(parsedData);
 
     const payload = buildPredictPayload(parsedData);
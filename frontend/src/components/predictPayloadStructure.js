@@ -1,3 +1,10 @@
+// Function to format a Date object as yyyy-mm-dd for the data range request
+export const toIsoDate = (date) => {
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const day = String(date.getDate()).padStart(2, '0');
+    return `${date.getFullYear()}-${month}-${day}`;
+  };
+
 // Function to parse and format each row of the CSV data
 export const parseCsvData = (csvData) => {
     return csvData.map(row => {